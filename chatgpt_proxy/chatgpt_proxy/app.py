@@ -26,34 +26,47 @@ client and OpenAI servers.
 """
 
 import asyncio
-import dataclasses
+import base64
 import datetime
+import ipaddress
+import math
 import multiprocessing as mp
 import os
 import secrets
+import ssl
+import string
+import sys
+import threading
+from functools import partial
 from http import HTTPStatus
 from multiprocessing.synchronize import Event as EventType
-from pprint import pprint
 from typing import Any
 from typing import Awaitable
+from typing import TypeAlias
 
 import asyncpg
 import httpx
 import openai
 import sanic
-from py_markdown_table.markdown_table import markdown_table
+import ujson
 from sanic import Blueprint
 from sanic.response import HTTPResponse
 
 from chatgpt_proxy.auth import auth
 from chatgpt_proxy.auth import check_and_inject_game
 from chatgpt_proxy.auth import is_real_game_server
+from chatgpt_proxy.cache import TTLCache
 from chatgpt_proxy.cache import app_cache
 from chatgpt_proxy.cache import db_cache
+from chatgpt_proxy.db import BatchWriter
+from chatgpt_proxy.db import connect
+from chatgpt_proxy.db import create_pool
 from chatgpt_proxy.db import pool_acquire
-from chatgpt_proxy.db import pool_acquire_many
 from chatgpt_proxy.db import queries
+from chatgpt_proxy.db.models import GameChatMessage
+from chatgpt_proxy.db.models import GameKill
 from chatgpt_proxy.db.models import GameObjectiveState
+from chatgpt_proxy.db.models import GamePlayer
 from chatgpt_proxy.db.models import SayType
 from chatgpt_proxy.db.models import Team
 from chatgpt_proxy.db.models import max_ast_literal_eval_size
@@ -63,14 +76,23 @@ from chatgpt_proxy.types import Context
 from chatgpt_proxy.types import Request
 from chatgpt_proxy.utils import get_remote_addr
 from chatgpt_proxy.utils import is_prod_env
+from chatgpt_proxy.utils import markdown_table
+from chatgpt_proxy.utils import max_body_size
 from chatgpt_proxy.utils import utcnow
 
-# TODO: This breaks with nest_asyncio, which is also unmaintained!
-# if platform.system() == "Windows":
-#     # noinspection PyUnresolvedReferences
-#     import winloop  # type: ignore[import-not-found]
-#
-#     winloop.install()
+# NOTE: Sanic already runs the server processes on uvloop/winloop when it's
+#   available. Only the background processes need to request it explicitly.
+#   Don't install them as the global policy, this breaks with nest_asyncio,
+#   which the tests use (and which is also unmaintained)!
+if sys.platform == "win32":
+    # noinspection PyUnresolvedReferences
+    import winloop  # type: ignore[import-not-found]
+
+    new_event_loop = winloop.new_event_loop
+else:
+    import uvloop
+
+    new_event_loop = uvloop.new_event_loop
 
 # TODO: need to come up with a more consistent way for logging errors
 #   from request validation, etc.:
@@ -83,13 +105,19 @@ api_v1 = Blueprint("api", version_prefix="/api/v", version=1)
 
 def db_maintenance_process(stop_event: EventType) -> None:
     logger.debug("db_maintenance_process starting")
-    asyncio.run(db_maintenance(stop_event))
+    asyncio.run(db_maintenance(stop_event), loop_factory=new_event_loop)
     asyncio.run(_suppress(app_cache.close()))  # TODO: this doesn't actually run ever?
     logger.debug("db_maintenance_process done")
 
 
 def refresh_steam_web_api_cache_process(stop_event: EventType) -> None:
-    asyncio.run(refresh_steam_web_api_cache(stop_event))
+    asyncio.run(refresh_steam_web_api_cache(stop_event), loop_factory=new_event_loop)
+
+
+# Sanic picks ujson automatically if it's importable, but be explicit
+# about it to never silently fall back to the slower stdlib json.
+json_dumps = partial(ujson.dumps, escape_forward_slashes=False)
+json_loads = ujson.loads
 
 
 def make_api_v1_app(name: str = "ChatGPTProxy", **kwargs: Any) -> App:
@@ -97,6 +125,8 @@ def make_api_v1_app(name: str = "ChatGPTProxy", **kwargs: Any) -> App:
         name,
         ctx=Context(),
         request_class=Request,  # type: ignore[arg-type]
+        dumps=json_dumps,
+        loads=json_loads,
         **kwargs,
     )
     # We don't expect UScript side to send large requests.
@@ -106,6 +136,13 @@ def make_api_v1_app(name: str = "ChatGPTProxy", **kwargs: Any) -> App:
     _app.config.SECRET = os.environ["SANIC_SECRET"]
     _app.config.JWT_ISSUER = auth.jwt_issuer
     _app.config.JWT_AUDIENCE = auth.jwt_audience
+    # The mutator keeps posting small requests to the same proxy for the
+    # whole match, reuse the connections instead of reconnecting each time.
+    # NOTE: the mutator must not pipeline requests on a kept-alive connection.
+    _app.config.KEEP_ALIVE = True
+    _app.config.KEEP_ALIVE_TIMEOUT = 60
+    # Access logging is relatively expensive compared to the tiny requests.
+    _app.config.ACCESS_LOG = False
 
     @_app.main_process_ready
     async def main_process_ready(app_: App):
@@ -124,6 +161,10 @@ def make_api_v1_app(name: str = "ChatGPTProxy", **kwargs: Any) -> App:
 
     @_app.main_process_start
     async def main_process_start(app_: App):
+        # Token hashing in auth relies on hashlib's OpenSSL backed SHA-256,
+        # which uses the CPU's SHA extensions when available.
+        logger.debug("OpenSSL version: {}", ssl.OPENSSL_VERSION)
+
         bg_process_event = mp.Event()
         app_.shared_ctx.bg_process_event = bg_process_event
 
@@ -133,27 +174,61 @@ def make_api_v1_app(name: str = "ChatGPTProxy", **kwargs: Any) -> App:
 
     @_app.before_server_start
     async def before_server_start(app_: App):
+        logger.debug("event loop: {}", type(asyncio.get_running_loop()))
+
+        # Shared by the OpenAI client and the Steam Web API checks.
+        # NOTE: HTTP/2 would need the optional h2 dependency, which we don't have.
+        app_.ctx.http_client = httpx.AsyncClient(
+            limits=http_client_limits,
+            timeout=http_client_timeout,
+            follow_redirects=True,
+        )
+        app_.ext.dependency(app_.ctx.http_client)
+
         api_key = os.environ.get("OPENAI_API_KEY")
-        client = openai.AsyncOpenAI(api_key=api_key)
+        client = openai.AsyncOpenAI(api_key=api_key, http_client=app_.ctx.http_client)
         app_.ctx.client = client
         app_.ext.dependency(client)
 
         db_url = os.environ.get("DATABASE_URL")
-        pool = await asyncpg.create_pool(dsn=db_url)
+        pool = await create_pool(
+            dsn=db_url,
+            min_size=pg_pool_min_size,
+            max_size=pg_pool_max_size,
+        )
+        logger.debug("created pool: min_size={}, max_size={}",
+                     pg_pool_min_size, pg_pool_max_size)
         app_.ctx.pg_pool = pool
         app_.ext.dependency(pool)
 
-        app_.ctx.http_client = httpx.AsyncClient()
-        app_.ext.dependency(app_.ctx.http_client)
+        app_.ctx.kill_writer = BatchWriter(pool, queries.copy_game_kills)
+        app_.ctx.kill_writer.start()
+        app_.ctx.chat_message_writer = BatchWriter(pool, queries.copy_game_chat_messages)
+        app_.ctx.chat_message_writer.start()
+
+        app_.ctx.game_id_queue = asyncio.Queue(maxsize=game_id_queue_size)
+        app_.ctx.game_id_refill_task = asyncio.create_task(
+            refill_game_ids(app_.ctx.game_id_queue))
 
     # noinspection PyProtectedMember
     @_app.before_server_stop
     async def before_server_stop(app_: App):
         logger.debug("before_server_stop")
 
+        if app_.ctx.game_id_refill_task:
+            app_.ctx.game_id_refill_task.cancel()
+
         # TODO: cleanup should have timeouts!
         #   If timed out, ignore it but log warning!
 
+        # Flush queued writes before the pool is closed.
+        if app_.ctx._kill_writer:
+            logger.debug("stopping kill writer")
+            await _suppress(app_.ctx._kill_writer.stop())
+        if app_.ctx._chat_message_writer:
+            logger.debug("stopping chat message writer")
+            await _suppress(app_.ctx._chat_message_writer.stop())
+
         if app_.ctx._client:
             logger.debug("closing OpenAI client")
             await _suppress(app_.ctx._client.close())
@@ -169,6 +244,11 @@ def make_api_v1_app(name: str = "ChatGPTProxy", **kwargs: Any) -> App:
         logger.debug("closing DB cache")
         await _suppress(db_cache.close())
 
+    # Registered outside the api_v1 blueprint to skip authentication.
+    @_app.get("/health")
+    async def health(_: Request) -> HTTPResponse:
+        return HTTPResponse(status=HTTPStatus.OK)
+
     _app.blueprint(api_v1)
 
     return _app
@@ -185,6 +265,38 @@ async def _suppress(f: Awaitable[Any]) -> Any:
 openai_model = "gpt-5-nano"
 openai_timeout = 60.0  # TODO: this might be way too low?
 
+http_client_limits = httpx.Limits(
+    max_keepalive_connections=64,
+    max_connections=128,
+    keepalive_expiry=60.0,
+)
+# OpenAI requests pass openai_timeout explicitly.
+http_client_timeout = httpx.Timeout(5.0)
+
+# Rendered scoreboard tables by game ID. The players rarely change between
+# consecutive prompts. Player updates invalidate the entry of this worker,
+# the short TTL bounds how stale the other workers' entries can get.
+_scoreboard_cache: TTLCache[str, tuple[int, str]] = TTLCache(maxsize=2048, ttl=10.0)
+
+# Initial OpenAI responses (response ID and output text) by (model, prompt).
+# A new game has no players, kills or chat messages yet, so the initial
+# prompt only varies by level and repeats on every map change.
+# NOTE: a cache hit reuses the cached response ID as the new game's
+# previous response ID, so games of the same level share a conversation
+# root and get the same greeting. Off by default for that reason. A single
+# request can also skip the cache with the X-Proxy-No-Cache header.
+initial_response_cache_enabled = os.environ.get(
+    "CHATGPT_PROXY_INITIAL_RESPONSE_CACHE", "0").lower() in ("1", "true")
+_initial_response_cache: TTLCache[tuple[str, str], tuple[str, str]] = TTLCache(
+    maxsize=256, ttl=datetime.timedelta(hours=1).total_seconds())
+
+
+def clear_caches() -> None:
+    """Clear all in-process response caches."""
+    _scoreboard_cache.clear()
+    _initial_response_cache.clear()
+
+
 prompt_max_game_chat_msgs = 30
 prompt_max_game_kills = 30
 
@@ -200,9 +312,10 @@ Vietnam war scenario. Keep your tone semi-serious, while using
 era and scenario appropriate humor every now and then.
 """
 
+# The LLM task is sent separately as the OpenAI instructions (system message),
+# which keeps the start of the request identical across calls and lets
+# OpenAI serve it from its prompt cache.
 base_prompt_initial = """
-{llm_task}
-
 This is the beginning of a new game. The current level is {level_sanitized}.
 
 The game currently contains the following players:
@@ -241,24 +354,90 @@ messages have been sent (last {num_messages} messages):
 game_expiration = datetime.timedelta(hours=5)
 api_key_deletion_leeway = datetime.timedelta(minutes=5)
 db_maintenance_interval = datetime.timedelta(minutes=30).total_seconds()
+# Enforced by Postgres with SET LOCAL for each maintenance transaction.
+# The client-side timeout is a bit longer so the server aborts first.
+db_maintenance_statement_timeout = datetime.timedelta(seconds=60)
+_db_maintenance_statement_timeout_sql = (
+    "SET LOCAL statement_timeout = "
+    f"{int(db_maintenance_statement_timeout.total_seconds() * 1000)}"
+)
+_db_maintenance_client_timeout = db_maintenance_statement_timeout.total_seconds() + 5.0
 steam_web_api_cache_refresh_interval = datetime.timedelta(minutes=30).total_seconds()
-
-game_id_length = 24
+# Max. concurrent Steam Web API requests per refresh, to stay clear of rate limits.
+steam_web_api_cache_refresh_concurrency = 8
+
+# Game ID length in bytes. The IDs are URL-safe base64 encoded without padding.
+game_id_length = 16
+game_id_queue_size = 64
+
+# Number of Sanic worker processes when running this module directly.
+num_workers = int(os.environ.get("CHATGPT_PROXY_WORKERS", os.cpu_count() or 1))
+
+# Request path connection pool size per worker. The total connection budget
+# is split between the workers to avoid overwhelming Postgres. Background
+# processes never borrow from it, so they can't starve request traffic:
+# database maintenance opens a single connection per run and the Steam Web
+# API cache refresher keeps its own 1 connection pool.
+# Both pool sizes can also be set explicitly.
+pg_max_connections = int(os.environ.get("CHATGPT_PROXY_PG_MAX_CONNECTIONS", 64))
+pg_pool_max_size = int(os.environ.get(
+    "CHATGPT_PROXY_PG_POOL_MAX_SIZE", max(4, pg_max_connections // num_workers)))
+pg_pool_min_size = int(os.environ.get(
+    "CHATGPT_PROXY_PG_POOL_MIN_SIZE", min(4, pg_pool_max_size)))
 
 # TODO: should this be parametrized? Sent in from the UScript side?
 max_message_length = 200
 
+# TODO: should we parametrize this?
+initial_instruction = (
+    f"Provide a short greeting/boot-up message "
+    f"(maximum length {max_message_length} characters)."
+)
+
+
+PromptTemplate: TypeAlias = tuple[tuple[str, ...], tuple[str, ...]]
+
+
+def compile_prompt_template(template: str) -> PromptTemplate:
+    """Split a str.format style template into its literal chunks and
+    field names once, so that rendering it doesn't re-parse the template.
+    Only plain replacement fields are supported.
+    """
+    literals: list[str] = []
+    fields: list[str] = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        if spec or conversion:
+            raise ValueError(f"unsupported replacement field: {field}")
+        literals.append(literal)
+        if field is not None:
+            fields.append(field)
+    if len(literals) == len(fields):
+        literals.append("")
+    return tuple(literals), tuple(fields)
+
+
+def render_prompt_template(template: PromptTemplate, **kwargs: Any) -> str:
+    literals, fields = template
+    parts = [literals[0]]
+    for field, literal in zip(fields, literals[1:]):
+        parts.append(str(kwargs[field]))
+        parts.append(literal)
+    return "".join(parts)
+
+
+_base_prompt_initial_template = compile_prompt_template(base_prompt_initial)
+_base_prompt_consecutive_template = compile_prompt_template(base_prompt_consecutive)
+
 
 def format_base_prompt_initial(
-        llm_task: str,
         level_sanitized: str,
         markdown_scoreboard_table: str,
         markdown_kills_table: str,
         markdown_chat_msgs_table: str,
         initial_instruction: str,
 ) -> str:
-    return base_prompt_initial.format(
-        llm_task=llm_task,
+    return render_prompt_template(
+        _base_prompt_initial_template,
         level_sanitized=level_sanitized,
         markdown_scoreboard_table=markdown_scoreboard_table,
         markdown_kills_table=markdown_kills_table,
@@ -275,7 +454,8 @@ def format_base_prompt_consecutive(
         num_msgs: int,
         instruction: str,
 ) -> str:
-    return base_prompt_consecutive.format(
+    return render_prompt_template(
+        _base_prompt_consecutive_template,
         markdown_scoreboard_table=markdown_scoreboard_table,
         markdown_kills_table=markdown_kills_table,
         num_kills=num_kills,
@@ -289,18 +469,47 @@ async def get_scoreboard_markdown_table(
         conn: asyncpg.Connection,
         game_id: str,
 ) -> tuple[int, str]:
+    cached = _scoreboard_cache.get(game_id)
+    if cached is not None:
+        return cached
+
     players = await queries.select_game_players(conn, game_id)
-    pprint(players)
 
     scoreboard = ""
     if players:
-        scoreboard = markdown_table([
-            player.as_markdown_dict()
-            for player in players
-        ]).get_markdown()
-        pprint(scoreboard)
+        scoreboard = markdown_table(
+            GamePlayer.markdown_columns,
+            (player.as_markdown_row() for player in players),
+        )
+        logger.trace("scoreboard:\n{}", scoreboard)
+
+    result = len(players), scoreboard
+    _scoreboard_cache.set(game_id, result)
+    return result
+
+
+def make_kills_markdown_table(kills: list[GameKill]) -> tuple[int, str]:
+    kills_table = ""
+    if kills:
+        kills_table = markdown_table(
+            GameKill.markdown_columns,
+            (kill.as_markdown_row() for kill in kills),
+        )
+        logger.trace("kills table:\n{}", kills_table)
+
+    return len(kills), kills_table
+
+
+def make_chat_messages_markdown_table(msgs: list[GameChatMessage]) -> tuple[int, str]:
+    msgs_table = ""
+    if msgs:
+        msgs_table = markdown_table(
+            GameChatMessage.markdown_columns,
+            (msg.as_markdown_row() for msg in msgs),
+        )
+        logger.trace("chat messages table:\n{}", msgs_table)
 
-    return len(players), scoreboard
+    return len(msgs), msgs_table
 
 
 async def get_kills_markdown_table(
@@ -314,17 +523,7 @@ async def get_kills_markdown_table(
         kill_time_from=from_time,
         limit=prompt_max_game_kills,
     )
-    pprint(candidate_kills)
-
-    kills_table = ""
-    if candidate_kills:
-        kills_table = markdown_table([
-            kill.as_markdown_dict()
-            for kill in candidate_kills
-        ]).get_markdown()
-        pprint(kills_table)
-
-    return len(candidate_kills), kills_table
+    return make_kills_markdown_table(candidate_kills)
 
 
 async def get_chat_messages_markdown_table(
@@ -338,23 +537,73 @@ async def get_chat_messages_markdown_table(
         send_time_from=from_time,
         limit=prompt_max_game_chat_msgs,
     )
-    pprint(candidate_msgs)
+    return make_chat_messages_markdown_table(candidate_msgs)
+
+
+async def get_markdown_tables(
+        conn: asyncpg.Connection,
+        game_id: str,
+        from_time: datetime.datetime,
+) -> tuple[tuple[int, str], tuple[int, str], tuple[int, str]]:
+    """Get the scoreboard, kills and chat messages tables for a prompt.
+    The scoreboard is usually cached, and the kills and chat messages
+    are fetched together, so this is at most two round-trips.
+    """
+    scoreboard = await get_scoreboard_markdown_table(conn, game_id)
+    candidate_kills, candidate_msgs = await queries.select_game_kills_and_chat_messages(
+        conn=conn,
+        game_id=game_id,
+        time_from=from_time,
+        kills_limit=prompt_max_game_kills,
+        chat_messages_limit=prompt_max_game_chat_msgs,
+    )
+    kills = make_kills_markdown_table(candidate_kills)
+    chat_msgs = make_chat_messages_markdown_table(candidate_msgs)
+    return scoreboard, kills, chat_msgs
+
+
+def encode_game_id(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
 
-    msgs_table = ""
-    if candidate_msgs:
-        msgs_table = markdown_table([
-            msg.as_markdown_dict()
-            for msg in candidate_msgs
-        ]).get_markdown()
-        pprint(msgs_table)
 
-    return len(candidate_msgs), msgs_table
+def make_game_id() -> str:
+    return encode_game_id(secrets.token_bytes(game_id_length))
+
+
+async def refill_game_ids(queue: asyncio.Queue[str]) -> None:
+    """Keep the queue topped up with pre-generated game IDs to keep
+    the CSPRNG read out of the post_game request path.
+    """
+    while True:
+        # Blocks while the queue is full.
+        await queue.put(make_game_id())
+
+        # Generate the rest of the missing IDs from a single read.
+        missing = queue.maxsize - queue.qsize()
+        if missing > 0:
+            buf = secrets.token_bytes(game_id_length * missing)
+            for i in range(0, len(buf), game_id_length):
+                queue.put_nowait(encode_game_id(buf[i:i + game_id_length]))
+
+
+_underscore_to_space = str.maketrans("_", " ")
+
+# Wire format enum values to members. Unknown values raise KeyError,
+# which the request body parsers treat as bad requests.
+_team_by_wire_value: dict[bytes, Team] = {
+    team.encode("ascii"): team for team in Team}
+_say_type_by_wire_value: dict[bytes, SayType] = {
+    say_type.encode("ascii"): say_type for say_type in SayType}
+# Integer values stored in the database, for handlers that only store
+# the values and don't need the enum members at all.
+_team_index_by_wire_value: dict[bytes, int] = {
+    team.encode("ascii"): int(team) for team in Team}
+_say_type_index_by_wire_value: dict[bytes, int] = {
+    say_type.encode("ascii"): int(say_type) for say_type in SayType}
 
 
 def sanitize_level_name(level: str) -> str:
-    level = level.split("-")[-1]
-    level = level.replace("_", " ")
-    return level
+    return level.rpartition("-")[2].translate(_underscore_to_space)
 
 
 @api_v1.get("/game/<game_id:str>")
@@ -370,113 +619,90 @@ async def get_game(
     async with pool_acquire(pg_pool) as conn:
         db_game = await queries.select_game(conn=conn, game_id=game_id)
 
-        if not db_game:
-            return HTTPResponse(status=HTTPStatus.NOT_FOUND)
-
-        game_dict = dataclasses.asdict(db_game)
-        game_dict["start_time"] = db_game.start_time.isoformat()
-        stop_time = db_game.stop_time
-        if stop_time:
-            game_dict["stop_time"] = stop_time.isoformat()
-        game_dict["game_server_address"] = str(db_game.game_server_address)
+    if not db_game:
+        return HTTPResponse(status=HTTPStatus.NOT_FOUND)
 
-        return sanic.json(game_dict)
+    return sanic.json(db_game.as_json_dict())
 
 
 @api_v1.post("/game")
+@max_body_size(512)
 async def post_game(
         request: Request,
         pg_pool: asyncpg.Pool,
         client: openai.AsyncOpenAI,
 ) -> HTTPResponse:
     try:
-        data = request.body.decode("utf-8")
-        level, friendly_level_name, port = data.split("\n")
-        game_port = int(port)
+        # Only decode the fields that are actually used as strings.
+        level_b, friendly_level_name_b, port_b = request.body.split(b"\n")
+        level = level_b.decode("utf-8")
+        friendly_level_name = friendly_level_name_b.decode("utf-8")
+        game_port = int(port_b)
     except Exception as e:
         logger.info("error parsing game data: {}: {}", type(e).__name__, e)
         logger.opt(exception=e).debug("")
         return HTTPResponse(status=HTTPStatus.BAD_REQUEST)
 
     now = utcnow()
-    game_id = secrets.token_hex(game_id_length)
+    try:
+        game_id = request.app.ctx.game_id_queue.get_nowait()
+    except asyncio.QueueEmpty:
+        game_id = make_game_id()
     addr = get_remote_addr(request)
 
-    # TODO: this would be so much better with functools.Placeholder!
-    tasks_args = (
-        (get_scoreboard_markdown_table, (game_id,)),
-        (get_kills_markdown_table, (game_id, now)),
-        (get_chat_messages_markdown_table, (game_id, now)),
+    if friendly_level_name:
+        level_sanitized = friendly_level_name
+    else:
+        level_sanitized = sanitize_level_name(level)
+
+    # The game doesn't exist before this request, so there are no players,
+    # kills or chat messages to query for yet. The OpenAI request is sent
+    # without any database round-trips in front of it.
+    prompt = format_base_prompt_initial(
+        level_sanitized=level_sanitized,
+        markdown_scoreboard_table="",
+        markdown_kills_table="",
+        markdown_chat_msgs_table="",
+        initial_instruction=initial_instruction,
     )
-    async with pool_acquire_many(
-            pool=pg_pool,
-            count=len(tasks_args),
-    ) as conns:
-        tasks = (
-            # TODO: fix this type error with Python 3.14 and
-            #   functools.Placeholder! Upgrade to 3.14!
-            task(conns[i], *args)  # type: ignore[operator]
-            for i, (task, args) in enumerate(tasks_args)
-        )
-        ((_, scoreboard_table),
-         (_, kills_table),
-         (_, chat_msgs_table)) = await asyncio.gather(*tasks)
 
-    async with pool_acquire(pg_pool) as conn:
-        async with conn.transaction():
-            await queries.insert_game(
-                conn=conn,
-                game_id=game_id,
-                level=level,
-                game_server_address=addr,
-                game_server_port=game_port,
-                start_time=now,
-                stop_time=None,
-                openai_previous_response_id=None,
-            )
-
-        # TODO: should this be parametrized? At least take in the name?
-        llm_task = default_llm_task
-
-        if friendly_level_name:
-            level_sanitized = friendly_level_name
-        else:
-            level_sanitized = sanitize_level_name(level)
-
-        # TODO: should we parametrize this?
-        initial_instruction = (
-            f"Provide a short greeting/boot-up message "
-            f"(maximum length {max_message_length} characters)."
+    use_cache = (
+            initial_response_cache_enabled
+            and "X-Proxy-No-Cache" not in request.headers
+    )
+    cache_key = (openai_model, prompt)
+    cached_resp = _initial_response_cache.get(cache_key) if use_cache else None
+    cached = cached_resp is not None
+    if cached_resp is None:
+        # Don't hold a connection while waiting for the OpenAI response.
+        # TODO: should the task be parametrized? At least take in the name?
+        openai_resp = await client.responses.create(
+            model=openai_model,
+            instructions=default_llm_task,
+            input=prompt,
+            timeout=openai_timeout,
         )
+        response_id = openai_resp.id
+        greeting = openai_resp.output_text
+        if use_cache:
+            _initial_response_cache.set(cache_key, (response_id, greeting))
+    else:
+        response_id, greeting = cached_resp
 
-        prompt = format_base_prompt_initial(
-            llm_task=llm_task,
-            level_sanitized=level_sanitized,
-            markdown_scoreboard_table=scoreboard_table,
-            markdown_kills_table=kills_table,
-            markdown_chat_msgs_table=chat_msgs_table,
-            initial_instruction=initial_instruction,
+    async with pool_acquire(pg_pool) as conn:
+        await queries.insert_game_and_openai_query(
+            conn=conn,
+            game_id=game_id,
+            level=level,
+            game_server_address=addr,
+            game_server_port=game_port,
+            time=now,
+            request_length=len(prompt),
+            response_length=len(greeting),
+            openai_response_id=response_id,
+            cached=cached,
         )
 
-        async with conn.transaction():
-            openai_resp = await client.responses.create(
-                model=openai_model,
-                input=prompt,
-                timeout=openai_timeout,
-            )
-            await queries.insert_openai_query(
-                game_id=game_id,
-                conn=conn,
-                time=utcnow(),
-                game_server_address=addr,
-                game_server_port=game_port,
-                request_length=len(prompt),
-                response_length=len(openai_resp.output_text),
-                openai_response_id=openai_resp.id,
-            )
-
-    greeting = openai_resp.output_text
-
     return sanic.text(
         f"{game_id}\n{greeting}",
         status=HTTPStatus.CREATED,
@@ -487,7 +713,7 @@ async def post_game(
 
 
 @api_v1.put("/game/<game_id:str>")
-@check_and_inject_game
+@max_body_size(64)
 async def put_game(
         request: Request,
         game_id: str,
@@ -502,24 +728,53 @@ async def put_game(
     # it's marked as finished by the game server.
     # TODO: make this support other fields too if needed.
 
-    start_time = request.ctx.game.start_time
+    addr = request.ctx.jwt_game_server_address
+    port = request.ctx.jwt_game_server_port
+    if addr is None or port is None:
+        logger.debug("cannot verify game owner: addr={}, port={}", addr, port)
+        return sanic.HTTPResponse("Unauthorized.", status=HTTPStatus.UNAUTHORIZED)
 
+    world_time: float | None
     try:
-        world_time = float(request.body.decode("utf-8"))
-        stop_time = start_time + datetime.timedelta(seconds=world_time)
+        world_time = float(request.body)
+        if not math.isfinite(world_time):
+            raise ValueError(f"world_time is not finite: {world_time}")
     except Exception as e:
         logger.debug("error parsing game data: {}: {}", type(e).__name__, e)
-        return HTTPResponse(status=HTTPStatus.BAD_REQUEST)
+        world_time = None
 
     async with pool_acquire(pg_pool) as conn:
-        async with conn.transaction():
-            await queries.update_game(
-                conn=conn,
-                game_id=game_id,
-                stop_time=stop_time,
-            )
+        # Game owner is checked by the update itself, skipping the
+        # check_and_inject_game round-trip for the common case.
+        if world_time is not None:
+            try:
+                updated = await queries.update_game_stop_time(
+                    conn=conn,
+                    game_id=game_id,
+                    world_time=world_time,
+                    game_server_address=addr,
+                    game_server_port=port,
+                )
+            except asyncpg.DataError as e:
+                logger.debug("invalid game stop time: {}: {}", type(e).__name__, e)
+                updated = False
 
-    return HTTPResponse(status=HTTPStatus.NO_CONTENT)
+            if updated:
+                _scoreboard_cache.pop(game_id)
+                return HTTPResponse(status=HTTPStatus.NO_CONTENT)
+
+        # Nothing was updated, find out why.
+        game = await queries.select_game(conn=conn, game_id=game_id)
+
+    if not game:
+        logger.debug("no game found for game_id: {}", game_id)
+        return HTTPResponse(status=HTTPStatus.NOT_FOUND)
+
+    error = auth.check_game_owner(request, game)
+    if error is not None:
+        return error
+
+    return HTTPResponse(status=HTTPStatus.BAD_REQUEST)
 
 
 @api_v1.post("/game/<game_id:str>/message")
@@ -534,50 +789,37 @@ async def post_game_message(
 
     game = request.ctx.game
 
-    previous_response_id: str | None = game.openai_previous_response_id
-    if previous_response_id is None:
-        logger.warning("unable to handle request for game with no openai_previous_response_id")
-        return HTTPResponse(status=HTTPStatus.SERVICE_UNAVAILABLE)
-
-    async with pool_acquire(pg_pool) as conn:
-        previous_query = await queries.select_openai_query(
-            conn=conn,
-            openai_response_id=previous_response_id,
+    # Both are set together when the game is created and after each message.
+    previous_response_id = game.openai_previous_response_id
+    previous_response_time = game.openai_previous_response_time
+    if previous_response_id is None or previous_response_time is None:
+        logger.warning(
+            "unable to handle request for game with no previous OpenAI response: "
+            "openai_previous_response_id={}, openai_previous_response_time={}",
+            previous_response_id,
+            previous_response_time,
         )
-    if not previous_query:
-        logger.warning("cannot find OpenAI query for id: {}", previous_response_id)
         return HTTPResponse(status=HTTPStatus.SERVICE_UNAVAILABLE)
 
     try:
-        data_in = request.body.decode("utf-8").split("\n")
-        say_type = SayType(data_in[0])
-        say_team = Team(data_in[1])
-        say_name = data_in[2]
-        prompt_in = data_in[3]
+        data_in = request.body.split(b"\n")
+        say_type = _say_type_by_wire_value[data_in[0]]
+        say_team = _team_by_wire_value[data_in[1]]
+        say_name = data_in[2].decode("utf-8")
+        prompt_in = data_in[3].decode("utf-8")
     except Exception as e:
         logger.info("error parsing game message data: {}: {}", type(e).__name__, e)
         # TODO: debug log stack trace or something?
         return HTTPResponse(status=HTTPStatus.BAD_REQUEST)
 
-    # TODO: this would be so much better with functools.Placeholder!
-    tasks_args = (
-        (get_scoreboard_markdown_table, (game_id,)),
-        (get_kills_markdown_table, (game_id, previous_query.time)),
-        (get_chat_messages_markdown_table, (game_id, previous_query.time)),
-    )
-    async with pool_acquire_many(
-            pool=pg_pool,
-            count=len(tasks_args),
-    ) as conns:
-        tasks = (
-            # TODO: fix this type error with Python 3.14 and
-            #   functools.Placeholder! Upgrade to 3.14!
-            task(conns[i], *args)  # type: ignore[operator]
-            for i, (task, args) in enumerate(tasks_args)
-        )
+    # The next prompt will include everything after this point, including
+    # kills and messages that arrive while waiting for the OpenAI response.
+    now = utcnow()
+    async with pool_acquire(pg_pool) as conn:
         ((_, scoreboard_table),
          (num_kills, kills_table),
-         (num_msgs, chat_msgs_table)) = await asyncio.gather(*tasks)
+         (num_msgs, chat_msgs_table)) = await get_markdown_tables(
+            conn, game_id, previous_response_time)
 
     # TODO: have some maximum upper limit for total prompt length?
     prompt = format_base_prompt_consecutive(
@@ -589,25 +831,28 @@ async def post_game_message(
         instruction=prompt_in,  # TODO!
     )
 
+    # TODO: how to best use instruction param here?
+    # Don't hold a connection while waiting for the OpenAI response.
+    # Instructions are not carried over from the previous response.
+    resp = await client.responses.create(
+        model=openai_model,
+        instructions=default_llm_task,
+        input=prompt,
+        previous_response_id=previous_response_id,
+        timeout=openai_timeout,
+    )
+
     async with pool_acquire(pg_pool) as conn:
-        async with conn.transaction():
-            # TODO: how to best use instruction param here?
-            resp = await client.responses.create(
-                model=openai_model,
-                input=prompt,
-                previous_response_id=previous_response_id,
-                timeout=openai_timeout,
-            )
-            await queries.insert_openai_query(
-                conn=conn,
-                game_id=game_id,
-                time=utcnow(),
-                game_server_address=game.game_server_address,
-                game_server_port=game.game_server_port,
-                request_length=len(prompt),
-                response_length=len(resp.output_text),
-                openai_response_id=resp.id,
-            )
+        await queries.insert_openai_query_and_update_game(
+            conn=conn,
+            time=now,
+            game_id=game_id,
+            game_server_address=game.game_server_address,
+            game_server_port=game.game_server_port,
+            request_length=len(prompt),
+            response_length=len(resp.output_text),
+            openai_response_id=resp.id,
+        )
 
     msg = resp.output_text.replace("\n", " ")
     resp_data = f"{say_type}\n{say_team}\n{say_name}\n{msg}"
@@ -619,22 +864,22 @@ async def post_game_message(
 
 
 @api_v1.post("/game/<game_id:str>/kill")
-@check_and_inject_game
+@max_body_size(512)
+@check_and_inject_game(use_cache=True)
 async def post_game_kill(
         request: Request,
         game_id: str,
-        pg_pool: asyncpg.Pool,
 ) -> HTTPResponse:
     game = request.ctx.game
 
     try:
-        parts = request.body.decode("utf-8").split("\n")
+        parts = request.body.split(b"\n")
         world_time = float(parts[0])
-        killer_name = parts[1]
-        victim_name = parts[2]
-        killer_team = Team(parts[3])
-        victim_team = Team(parts[4])
-        damage_type = parts[5]
+        killer_name = parts[1].decode("utf-8")
+        victim_name = parts[2].decode("utf-8")
+        killer_team = _team_index_by_wire_value[parts[3]]
+        victim_team = _team_index_by_wire_value[parts[4]]
+        damage_type = parts[5].decode("utf-8")
         kill_distance_m = float(parts[6])
 
         kill_time = game.start_time + datetime.timedelta(seconds=world_time)
@@ -642,113 +887,109 @@ async def post_game_kill(
         logger.debug("failed to parse game kill data: {}: {}", type(e).__name__, e)
         return sanic.HTTPResponse(status=HTTPStatus.BAD_REQUEST)
 
-    async with pool_acquire(pg_pool) as conn:
-        async with conn.transaction():
-            await queries.insert_game_kill(
-                conn=conn,
-                game_id=game_id,
-                kill_time=kill_time,
-                killer_name=killer_name,
-                victim_name=victim_name,
-                killer_team=killer_team,
-                victim_team=victim_team,
-                damage_type=damage_type,
-                kill_distance_m=kill_distance_m,
-            )
+    # Kills arrive in bursts, they are written in batches with other
+    # concurrent requests' kills.
+    await request.app.ctx.kill_writer.write((
+        game_id,
+        kill_time,
+        killer_name,
+        victim_name,
+        killer_team,
+        victim_team,
+        damage_type,
+        kill_distance_m,
+    ))
 
     return sanic.HTTPResponse(status=HTTPStatus.NO_CONTENT)
 
 
 @api_v1.put("/game/<game_id:str>/player/<player_id:int>")
-@check_and_inject_game
+@max_body_size(256)
+@check_and_inject_game(hold_conn=True, use_cache=True)
 async def put_game_player(
         request: Request,
         game_id: str,
         player_id: int,
-        pg_pool: asyncpg.Pool,
 ) -> HTTPResponse:
     _ = request.ctx.game  # TODO: needed here?
 
     try:
-        parts = request.body.decode("utf-8").split("\n")
-        name = parts[0]
-        team = Team(parts[1])
+        parts = request.body.split(b"\n")
+        name = parts[0].decode("utf-8")
+        team_index = _team_index_by_wire_value[parts[1]]
         score = int(parts[2])
     except Exception as e:
         logger.debug("failed to parse game player data: {}: {}", type(e).__name__, e)
         return sanic.HTTPResponse(status=HTTPStatus.BAD_REQUEST)
 
-    async with pool_acquire(pg_pool) as conn:
-        async with conn.transaction():
-            created = await queries.upsert_game_player(
-                conn=conn,
-                game_id=game_id,
-                player_id=player_id,
-                name=name,
-                team_index=int(team),
-                score=score,
-            )
+    conn = request.ctx.conn
+    created = await queries.upsert_game_player(
+        conn=conn,
+        game_id=game_id,
+        player_id=player_id,
+        name=name,
+        team_index=team_index,
+        score=score,
+    )
+    _scoreboard_cache.pop(game_id)
 
     status = HTTPStatus.CREATED if created else HTTPStatus.NO_CONTENT
     return sanic.HTTPResponse(status=status)
 
 
 @api_v1.delete("/game/<game_id:str>/player/<player_id:int>")
-@check_and_inject_game
+@check_and_inject_game(hold_conn=True, use_cache=True)
 async def delete_game_player(
-        _: Request,
+        request: Request,
         game_id: str,
         player_id: int,
-        pg_pool: asyncpg.Pool,
 ) -> HTTPResponse:
-    async with pool_acquire(pg_pool) as conn:
-        if not await queries.game_player_exists(
-                conn=conn,
-                game_id=game_id,
-                player_id=player_id,
-        ):
-            return HTTPResponse(status=HTTPStatus.NOT_FOUND)
-
-        async with conn.transaction():
-            await queries.delete_game_player(
-                conn=conn,
-                game_id=game_id,
-                player_id=player_id,
-            )
+    conn = request.ctx.conn
+    if not await queries.game_player_exists(
+            conn=conn,
+            game_id=game_id,
+            player_id=player_id,
+    ):
+        return HTTPResponse(status=HTTPStatus.NOT_FOUND)
+
+    await queries.delete_game_player(
+        conn=conn,
+        game_id=game_id,
+        player_id=player_id,
+    )
+    _scoreboard_cache.pop(game_id)
 
     return HTTPResponse(status=HTTPStatus.NO_CONTENT)
 
 
 @api_v1.post("/game/<game_id:str>/chat_message")
-@check_and_inject_game
+@max_body_size(1024)
+@check_and_inject_game(use_cache=True)
 async def post_game_chat_message(
         request: Request,
         game_id: str,
-        pg_pool: asyncpg.Pool,
 ) -> HTTPResponse:
     _ = request.ctx.game  # TODO: needed here?
 
     try:
-        parts = request.body.decode("utf-8").split("\n")
-        player_name = parts[0]
-        player_team = Team(parts[1])
-        say_type = SayType(parts[2])
-        msg = parts[3]
-        async with pool_acquire(pg_pool) as conn:
-            async with conn.transaction():
-                await queries.insert_game_chat_message(
-                    conn=conn,
-                    game_id=game_id,
-                    message=msg,
-                    send_time=utcnow(),
-                    sender_name=player_name,
-                    sender_team=player_team,
-                    channel=say_type,
-                )
+        parts = request.body.split(b"\n")
+        player_name = parts[0].decode("utf-8")
+        player_team = _team_index_by_wire_value[parts[1]]
+        say_type = _say_type_index_by_wire_value[parts[2]]
+        msg = parts[3].decode("utf-8")
     except Exception as e:
         logger.debug("failed to parse chat message data: {}: {}", type(e).__name__, e)
         return sanic.HTTPResponse(status=HTTPStatus.BAD_REQUEST)
 
+    await request.app.ctx.chat_message_writer.write((
+        msg,
+        game_id,
+        utcnow(),
+        player_name,
+        player_team,
+        say_type,
+    ))
+
     return sanic.HTTPResponse(
         status=HTTPStatus.NO_CONTENT,
         # TODO: do even want to do this? Do we need getters for these resources?
@@ -757,23 +998,21 @@ async def post_game_chat_message(
 
 
 @api_v1.put("/game/<game_id:str>/objective_state")
-@check_and_inject_game
+# Also avoids passing long strings to literal_eval
+# in case the legacy objective state format is used.
+@max_body_size(max_ast_literal_eval_size)
+@check_and_inject_game(hold_conn=True, use_cache=True)
 async def put_game_objective_state(
         request: Request,
         game_id: str,
-        pg_pool: asyncpg.Pool,
 ) -> HTTPResponse:
-    # Defensive check to avoid passing long strings to literal_eval.
-    if len(request.body) > max_ast_literal_eval_size:
-        return sanic.HTTPResponse(status=HTTPStatus.BAD_REQUEST)
-
     _ = request.ctx.game  # TODO: needed here?
 
     # TODO: maybe do proper relative DB design for this if needed?
     #       Right now it is done the quick and dirty way on purpose.
-    # [("Objective A",0),("Objective B",1),...]
+    # [["Objective A",0],["Objective B",1],...]
     try:
-        data = request.body.decode("utf-8")
+        data = request.body
         if not data:
             raise ValueError("no objective state data")
 
@@ -787,75 +1026,143 @@ async def put_game_objective_state(
         logger.opt(exception=e).debug("")  # TODO: should use this more!
         return HTTPResponse(status=HTTPStatus.BAD_REQUEST)
 
-    async with pool_acquire(pg_pool) as conn:
-        async with conn.transaction():
-            created = await queries.upsert_game_objective_state(
-                conn=conn,
-                state=obj_state,
-            )
+    conn = request.ctx.conn
+    created = await queries.upsert_game_objective_state(
+        conn=conn,
+        state=obj_state,
+    )
 
     status = HTTPStatus.CREATED if created else HTTPStatus.NO_CONTENT
     return sanic.HTTPResponse(status=status)
 
 
-async def db_maintenance(stop_event: EventType) -> None:
-    pool: asyncpg.Pool | None = None
+def _make_async_stop_event(stop_event: EventType) -> asyncio.Event:
+    """Return an asyncio.Event that is set once the (blocking) stop_event
+    is set. Lets background loops wait on the stop event without blocking
+    the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    async_stop_event = asyncio.Event()
+
+    def watch_stop_event() -> None:
+        stop_event.wait()
+        try:
+            loop.call_soon_threadsafe(async_stop_event.set)
+        except RuntimeError:
+            # Event loop is already closed, nothing to stop.
+            pass
+
+    threading.Thread(target=watch_stop_event, daemon=True).start()
+    return async_stop_event
+
+
+async def _wait_for_stop(stop_event: asyncio.Event, timeout: float) -> bool:
+    """Wait for stop_event for at most timeout seconds.
+    Returns True if stop_event was set.
+    """
+    try:
+        await asyncio.wait_for(stop_event.wait(), timeout)
+    except TimeoutError:
+        return False
+    return True
+
 
+async def db_maintenance(stop_event: EventType) -> None:
     try:
         logger.debug("db_maintenance starting")
 
+        async_stop_event = _make_async_stop_event(stop_event)
+
         db_url = os.environ.get("DATABASE_URL")
-        pool = await asyncpg.create_pool(dsn=db_url, min_size=1, max_size=1)
 
-        while not stop_event.wait(db_maintenance_interval):
-            async with pool_acquire(pool) as conn:
+        # Maintenance runs rarely, so connect for each run instead
+        # of holding an idle pooled connection open in between.
+        while not await _wait_for_stop(async_stop_event, db_maintenance_interval):
+            async with connect(dsn=db_url) as conn:
                 async with conn.transaction():
-                    result = await queries.delete_completed_games(conn, game_expiration)
+                    await conn.execute(_db_maintenance_statement_timeout_sql)
+                    result = await queries.delete_completed_games(
+                        conn,
+                        game_expiration,
+                        timeout=_db_maintenance_client_timeout,
+                    )
                     logger.info("delete_completed_games: {}", result)
 
                 async with conn.transaction():
+                    await conn.execute(_db_maintenance_statement_timeout_sql)
                     result = await queries.delete_old_api_keys(
                         conn,
                         leeway=api_key_deletion_leeway,
+                        timeout=_db_maintenance_client_timeout,
                     )
                     logger.info("delete_old_api_keys: {}", result)
 
     except KeyboardInterrupt:
+        pass
+    finally:
         logger.debug("db_maintenance stopping")
-        if pool:
-            await pool.close()
+
+
+async def _refresh_is_real_game_server(
+        semaphore: asyncio.Semaphore,
+        game_server_address: ipaddress.IPv4Address,
+        game_server_port: int,
+        pg_pool: asyncpg.Pool,
+        http_client: httpx.AsyncClient,
+) -> bool:
+    async with semaphore:
+        return await is_real_game_server(
+            game_server_address=game_server_address,
+            game_server_port=game_server_port,
+            pg_pool=pg_pool,
+            http_client=http_client,
+        )
 
 
 async def refresh_steam_web_api_cache(stop_event: EventType) -> None:
     pool: asyncpg.Pool | None = None
+    # Shared between refreshes to keep the connections to Steam alive.
+    client: httpx.AsyncClient | None = None
 
     try:
+        async_stop_event = _make_async_stop_event(stop_event)
+
         db_url = os.environ.get("DATABASE_URL")
-        pool = await asyncpg.create_pool(dsn=db_url, min_size=1, max_size=1)
+        pool = await create_pool(dsn=db_url, min_size=1, max_size=1)
+        client = httpx.AsyncClient(timeout=30.0)
+        semaphore = asyncio.Semaphore(steam_web_api_cache_refresh_concurrency)
 
-        while not stop_event.wait(steam_web_api_cache_refresh_interval):
+        while not await _wait_for_stop(async_stop_event, steam_web_api_cache_refresh_interval):
             async with pool_acquire(pool) as conn:
                 api_keys = await queries.select_game_server_api_keys(conn)
                 logger.info("refreshing Steam Web API cache for {} keys", len(api_keys))
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                tasks = [
-                    is_real_game_server(
-                        game_server_address=api_key["game_server_address"],
-                        game_server_port=api_key["game_server_port"],
-                        pg_pool=pool,
-                        http_client=client,
-                    )
-                    for api_key in api_keys
-                ]
-                await asyncio.gather(*tasks)
+            tasks = [
+                _refresh_is_real_game_server(
+                    semaphore=semaphore,
+                    game_server_address=api_key["game_server_address"],
+                    game_server_port=api_key["game_server_port"],
+                    pg_pool=pool,
+                    http_client=client,
+                )
+                for api_key in api_keys
+            ]
+            await asyncio.gather(*tasks)
 
     except KeyboardInterrupt:
+        pass
+    finally:
+        if client:
+            await client.aclose()
         if pool:
             await pool.close()
 
 
 @api_v1.on_request
 async def api_v1_on_request(request: Request) -> HTTPResponse | None:
+    # Preflight requests carry no credentials, don't bother checking them.
+    if request.method == "OPTIONS":
+        return None
+
     authenticated = await auth.check_token(request, request.app.ctx.pg_pool)
     if not authenticated:
         return sanic.text("Unauthorized.", status=HTTPStatus.UNAUTHORIZED)
@@ -863,9 +1170,22 @@ async def api_v1_on_request(request: Request) -> HTTPResponse | None:
     return None
 
 
+@api_v1.exception(asyncpg.ForeignKeyViolationError)
+async def api_v1_on_foreign_key_violation(
+        _: Request,
+        e: asyncpg.ForeignKeyViolationError,
+) -> HTTPResponse:
+    # The game was deleted after it was checked by check_and_inject_game.
+    logger.debug("foreign key violation: {}", e)
+    return HTTPResponse(status=HTTPStatus.NOT_FOUND)
+
+
 app = make_api_v1_app()
 
 if __name__ == "__main__":
-    app.config.INSPECTOR = True
-    logger.level("DEBUG")
-    app.run(host="0.0.0.0", port=8080, debug=True, dev=True, access_log=True)
+    if is_prod_env:
+        app.run(host="0.0.0.0", port=8080, workers=num_workers, access_log=False)
+    else:
+        app.config.INSPECTOR = True
+        logger.level("DEBUG")
+        app.run(host="0.0.0.0", port=8080, debug=True, dev=True, access_log=True)
@@ -1,5 +1,7 @@
 from .auth import check_and_inject_game
+from .auth import check_game_owner
 from .auth import check_token
+from .auth import clear_caches
 from .auth import is_real_game_server
 from .auth import jwt_audience
 from .auth import jwt_issuer
@@ -7,7 +9,9 @@ from .auth import load_config
 
 __all__ = [
     "check_and_inject_game",
+    "check_game_owner",
     "check_token",
+    "clear_caches",
     "is_real_game_server",
     "jwt_audience",
     "jwt_issuer",
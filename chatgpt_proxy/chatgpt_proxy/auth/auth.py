@@ -26,6 +26,8 @@ import datetime
 import hashlib
 import ipaddress
 import os
+import time
+from dataclasses import dataclass
 from functools import wraps
 from http import HTTPStatus
 from inspect import isawaitable
@@ -37,12 +39,14 @@ import httpx
 import jwt
 import sanic
 
+from chatgpt_proxy.cache import TTLCache
 from chatgpt_proxy.db import pool_acquire
 from chatgpt_proxy.db import queries
+from chatgpt_proxy.db.models import Game
 from chatgpt_proxy.log import logger
 from chatgpt_proxy.steam import steam
 from chatgpt_proxy.types import Request
-from chatgpt_proxy.utils import get_remote_addr
+from chatgpt_proxy.utils import get_remote_addr_str
 
 jwt_issuer = "ChatGPTProxy"
 jwt_audience = "ChatGPTProxy"
@@ -58,7 +62,49 @@ def load_config() -> None:
 load_config()
 
 ttl_is_real_game_server = datetime.timedelta(minutes=60).total_seconds()
-ttl_validate_db_token = datetime.timedelta(minutes=5).total_seconds()
+ttl_api_key_hash = datetime.timedelta(seconds=60).total_seconds()
+
+
+@dataclass(slots=True, frozen=True)
+class _TokenInfo:
+    token_hash: bytes
+    addr_str: str
+    addr: ipaddress.IPv4Address
+    port: int
+    exp: float
+
+
+# Verified and parsed info of recently seen tokens, to avoid running the
+# full jwt.decode and hashing the token for every request. Entries never
+# outlive the token's exp.
+ttl_jwt_claims = 5.0
+_token_info_cache: TTLCache[str, _TokenInfo] = TTLCache(maxsize=1024, ttl=ttl_jwt_claims)
+
+# Tokens that recently passed the API key hash and Steam Web API checks.
+# Skipping those checks for a while saves a database round-trip and an
+# outbound Steam request per request. Deleted API keys are only noticed
+# once the entry expires, same as with _api_key_hash_cache.
+ttl_verified_token = datetime.timedelta(seconds=60).total_seconds()
+_verified_token_cache: TTLCache[str, bool] = TTLCache(maxsize=4096, ttl=ttl_verified_token)
+
+# Game server API key hashes by (address, port), to avoid a database
+# round-trip for every request.
+_api_key_hash_cache: TTLCache[tuple[ipaddress.IPv4Address, int], bytes] = TTLCache(
+    maxsize=512, ttl=ttl_api_key_hash)
+
+# Games by ID for check_and_inject_game(use_cache=True). Only the fields
+# that never change after the game is created are meant to be read from
+# these, the rest can be stale.
+ttl_game = datetime.timedelta(seconds=60).total_seconds()
+_game_cache: TTLCache[str, Game] = TTLCache(maxsize=4096, ttl=ttl_game)
+
+
+def clear_caches() -> None:
+    """Clear all in-process authentication caches."""
+    _token_info_cache.clear()
+    _verified_token_cache.clear()
+    _api_key_hash_cache.clear()
+    _game_cache.clear()
 
 
 def is_real_game_server_key_builder(*args, **kwargs) -> str:
@@ -128,39 +174,17 @@ async def is_real_game_server(
         return False
 
 
-def validate_db_token_key_builder(*args, **kwargs) -> str:
-    """NOTE: this function is specific to validate_db_token!"""
-
-    # NOTE: has to be kept in sync manually with
-    #       the real signature of validate_db_token!
-    args = args[:-1]
-
-    ordered_kwargs = sorted(kwargs.items())
-    return (
-        f"{validate_db_token.__module__ or ""}"
-        f"{validate_db_token.__name__}"
-        f"{str(args)}"
-        f"{str(ordered_kwargs)}"
-    )
-
-
-# @aiocache.cached(
-#     # cache=app_cache,
-#     cache=aiocache.Cache.MEMORY,
-#     ttl=ttl_validate_db_token,
-#     key_builder=validate_db_token_key_builder,
-#     # NOTE: Only cache the result if the server was successfully verified.
-#     skip_cache_func=lambda x: x is False,
-# )
-async def validate_db_token(
-        request_token_hash: bytes,
+async def select_api_key_hash(
         addr: ipaddress.IPv4Address,
         port: int,
         pg_pool: asyncpg.Pool,
-) -> bool:
-    # TODO: we should cache this in memory (LRU) or diskcache.
-    # TODO: if an API key is deleted from the database, the cache
-    #       for said API key should also be cleared!
+        use_cache: bool = True,
+) -> bytes | None:
+    key = (addr, port)
+    if use_cache:
+        api_key_hash = _api_key_hash_cache.get(key)
+        if api_key_hash is not None:
+            return api_key_hash
 
     async with pool_acquire(pg_pool) as conn:
         api_key = await queries.select_game_server_api_key(
@@ -169,14 +193,37 @@ async def validate_db_token(
             game_server_port=port,
         )
 
-        logger.debug("api_key: {}", api_key)
+    logger.debug("api_key: {}", api_key)
 
-        if not api_key:
-            logger.debug("JWT validation failed: no API key for {}:{}", addr, port)
-            return False
+    # NOTE: misses are not cached on purpose, new keys should be usable right away.
+    if not api_key:
+        _api_key_hash_cache.pop(key)
+        return None
+
+    api_key_hash = api_key["api_key_hash"]
+    _api_key_hash_cache.set(key, api_key_hash)
+    return api_key_hash
+
+
+async def validate_db_token(
+        request_token_hash: bytes,
+        addr: ipaddress.IPv4Address,
+        port: int,
+        pg_pool: asyncpg.Pool,
+) -> bool:
+    # TODO: if an API key is deleted from the database, the cache
+    #       for said API key should also be cleared! For now, we rely
+    #       on the short TTL and the JWT exp check.
 
-        db_api_key_hash: bytes = api_key["api_key_hash"]
-        if not compare_digest(request_token_hash, db_api_key_hash):
+    db_api_key_hash = await select_api_key_hash(addr, port, pg_pool)
+    if db_api_key_hash is None:
+        logger.debug("JWT validation failed: no API key for {}:{}", addr, port)
+        return False
+
+    if not compare_digest(request_token_hash, db_api_key_hash):
+        # The cached hash may be stale if the key was re-issued, check the DB once more.
+        db_api_key_hash = await select_api_key_hash(addr, port, pg_pool, use_cache=False)
+        if db_api_key_hash is None or not compare_digest(request_token_hash, db_api_key_hash):
             logger.debug("JWT validation failed: stored hash does not match token hash")
             return False
 
@@ -188,37 +235,60 @@ async def check_token(request: Request, pg_pool: asyncpg.Pool) -> bool:
         logger.debug("JWT validation failed: no token")
         return False
 
-    try:
-        token = jwt.decode(
-            jwt=request.token,
-            key=request.app.config.SECRET,
-            options={"require": ["exp", "iss", "sub", "aud"]},
-            algorithms=["HS256"],
-            audience=request.app.config.JWT_AUDIENCE,
-            issuer=request.app.config.JWT_ISSUER,
-        )
-    except jwt.exceptions.PyJWTError as e:
-        logger.debug("JWT validation failed: {}: {}", type(e).__name__, e)
-        return False
+    token_info = _token_info_cache.get(request.token)
+    if token_info is None:
+        try:
+            token = jwt.decode(
+                jwt=request.token,
+                key=request.app.config.SECRET,
+                options={"require": ["exp", "iss", "sub", "aud"]},
+                algorithms=["HS256"],
+                audience=request.app.config.JWT_AUDIENCE,
+                issuer=request.app.config.JWT_ISSUER,
+            )
+
+            # JWT subject should be IP:port.
+            sub: str = token["sub"]
+            a, p = sub.split(":")
+            token_info = _TokenInfo(
+                # The token was successfully decoded, so it's plain base64url, which is ASCII.
+                token_hash=hashlib.sha256(request.token.encode("ascii")).digest(),
+                addr_str=a,
+                addr=ipaddress.IPv4Address(a),
+                port=int(p),
+                exp=token["exp"],
+            )
+        except (jwt.exceptions.PyJWTError, ValueError) as e:
+            logger.debug("JWT validation failed: {}: {}", type(e).__name__, e)
+            return False
+
+        _token_info_cache.set(request.token, token_info, ttl=token_info.exp - time.time())
 
-    # JWT subject should be IP:port.
-    sub: str = token["sub"]
-    a, p = sub.split(":")
-    addr = ipaddress.IPv4Address(a)
-    port = int(p)
+    addr = token_info.addr
+    port = token_info.port
     logger.debug("token addr:port: {}:{}", addr, port)
 
     # Small extra step of security since we can't use HTTPS.
     # In any case, this is not really secure, but better than nothing.
-    client_addr = get_remote_addr(request)
+    # Plain string comparison first, only parse the address if it differs.
+    client_addr = get_remote_addr_str(request)
     logger.debug("client_addr: {}", client_addr)
-    if client_addr != addr:
-        logger.debug("JWT validation failed: (client_addr != addr): {} != {}", client_addr, addr)
-        return False
+    if client_addr != token_info.addr_str:
+        try:
+            client_addr_ok = ipaddress.IPv4Address(client_addr) == addr
+        except ValueError:
+            client_addr_ok = False
+        if not client_addr_ok:
+            logger.debug("JWT validation failed: (client_addr != addr): {} != {}", client_addr, addr)
+            return False
+
+    if _verified_token_cache.get(request.token) is not None:
+        request.ctx.jwt_game_server_port = port
+        request.ctx.jwt_game_server_address = addr
+        return True
 
-    req_token_hash = hashlib.sha256(request.token.encode("utf-8")).digest()
     if not await validate_db_token(
-            request_token_hash=req_token_hash,
+            request_token_hash=token_info.token_hash,
             addr=addr,
             port=port,
             pg_pool=pg_pool,
@@ -240,13 +310,78 @@ async def check_token(request: Request, pg_pool: asyncpg.Pool) -> bool:
                          "according to Steam Web API")
             return False
 
+    _verified_token_cache.set(request.token, True, ttl=token_info.exp - time.time())
+
     request.ctx.jwt_game_server_port = port
     request.ctx.jwt_game_server_address = addr
 
     return True
 
 
-def check_and_inject_game(func: Callable) -> Callable:
+async def _call_handler(f: Callable, *args, **kwargs) -> sanic.HTTPResponse:
+    response = f(*args, **kwargs)
+    if isawaitable(response):
+        return await response
+    return response  # pragma: no coverage
+
+
+async def _call_handler_with_conn(
+        f: Callable,
+        request: Request,
+        conn: asyncpg.Connection,
+        *args,
+        **kwargs,
+) -> sanic.HTTPResponse:
+    request.ctx.conn = conn
+    try:
+        return await _call_handler(f, request, *args, **kwargs)
+    finally:
+        request.ctx.conn = None
+
+
+def check_game_owner(request: Request, game: Game) -> sanic.HTTPResponse | None:
+    """Return an error response if the game does not belong
+    to the requesting game server, otherwise None.
+    """
+    if game.game_server_address != request.ctx.jwt_game_server_address:
+        logger.debug(
+            "unauthorized: token address != DB address: {} != {}",
+            game.game_server_address,
+            request.ctx.jwt_game_server_address,
+        )
+        return sanic.HTTPResponse("Unauthorized.", status=HTTPStatus.UNAUTHORIZED)
+
+    if game.game_server_port != request.ctx.jwt_game_server_port:
+        logger.debug(
+            "unauthorized: token port != DB port: {} != {}",
+            game.game_server_port,
+            request.ctx.jwt_game_server_port,
+        )
+        return sanic.HTTPResponse("Unauthorized.", status=HTTPStatus.UNAUTHORIZED)
+
+    return None
+
+
+def check_and_inject_game(
+        func: Callable | None = None,
+        *,
+        hold_conn: bool = False,
+        use_cache: bool = False,
+) -> Callable:
+    """Check that the game exists and belongs to the requesting game
+    server and inject it into request.ctx.game.
+
+    With hold_conn=True, the connection used for the check is kept
+    for the duration of the handler and injected into request.ctx.conn,
+    saving the handler a second pool checkout. Don't use it for handlers
+    that do slow non-database work, such as OpenAI requests.
+
+    With use_cache=True, recently seen games are checked without a
+    database round-trip. Only for handlers that use nothing but the
+    immutable fields of the game: id, level, start_time and the game
+    server address and port.
+    """
+
     def decorator(f: Callable) -> Callable:
         @wraps(f)
         async def game_owner_checked_handler(
@@ -265,35 +400,44 @@ def check_and_inject_game(func: Callable) -> Callable:
                 )
                 return sanic.HTTPResponse("Unauthorized.", status=HTTPStatus.UNAUTHORIZED)
 
+            game = _game_cache.get(game_id) if use_cache else None
+            if game is not None:
+                error = check_game_owner(request, game)
+                if error is not None:
+                    return error
+
+                request.ctx.game = game
+
+                if hold_conn:
+                    async with pool_acquire(request.app.ctx.pg_pool) as conn:
+                        return await _call_handler_with_conn(
+                            f, request, conn, game_id=game_id, *args, **kwargs)
+
+                return await _call_handler(f, request, game_id=game_id, *args, **kwargs)
+
             async with pool_acquire(request.app.ctx.pg_pool) as conn:
                 game = await queries.select_game(conn=conn, game_id=game_id)
                 if not game:
                     logger.debug("no game found for game_id: {}", game_id)
                     return sanic.HTTPResponse(status=HTTPStatus.NOT_FOUND)
 
-                if game.game_server_address != request.ctx.jwt_game_server_address:
-                    logger.debug(
-                        "unauthorized: token address != DB address: {} != {}",
-                        game.game_server_address,
-                        request.ctx.jwt_game_server_address,
-                    )
-                    return sanic.HTTPResponse("Unauthorized.", status=HTTPStatus.UNAUTHORIZED)
-
-                if game.game_server_port != request.ctx.jwt_game_server_port:
-                    logger.debug(
-                        "unauthorized: token port != DB port: {} != {}",
-                        game.game_server_port,
-                        request.ctx.jwt_game_server_port,
-                    )
-                    return sanic.HTTPResponse("Unauthorized.", status=HTTPStatus.UNAUTHORIZED)
+                if use_cache:
+                    _game_cache.set(game_id, game)
+
+                error = check_game_owner(request, game)
+                if error is not None:
+                    return error
 
                 request.ctx.game = game
 
-            response = f(request, game_id=game_id, *args, **kwargs)
-            if isawaitable(response):
-                return await response
-            return response  # pragma: no coverage
+                if hold_conn:
+                    return await _call_handler_with_conn(
+                        f, request, conn, game_id=game_id, *args, **kwargs)
+
+            return await _call_handler(f, request, game_id=game_id, *args, **kwargs)
 
         return game_owner_checked_handler
 
+    if func is None:
+        return decorator
     return decorator(func)
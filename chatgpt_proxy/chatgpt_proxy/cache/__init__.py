@@ -1,9 +1,11 @@
 from .cache import CacheNamespace
+from .cache import TTLCache
 from .cache import app_cache
 from .cache import db_cache
 
 __all__ = [
     "CacheNamespace",
+    "TTLCache",
     "app_cache",
     "db_cache",
 ]
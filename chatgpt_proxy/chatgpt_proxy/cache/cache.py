@@ -21,6 +21,8 @@
 # SOFTWARE.
 
 import os
+import time
+from collections import OrderedDict
 from enum import StrEnum
 
 import aiocache
@@ -37,6 +39,61 @@ class CacheNamespace(StrEnum):
     App = "app"
 
 
+class TTLCache[K, V]:
+    """Small process-local LRU cache with per-entry expiration.
+
+    Meant for hot path lookups where going through aiocache (and its
+    serializer) would cost more than the lookup itself. Not thread-safe,
+    only use it from a single event loop.
+    """
+
+    __slots__ = ("maxsize", "ttl", "_data")
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """Store value for key. Optional ttl can only shorten the
+        cache-wide ttl, never extend it.
+        """
+        if ttl is None or ttl > self.ttl:
+            ttl = self.ttl
+        if ttl <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> V | None:
+        item = self._data.pop(key, None)
+        if item is None:
+            return None
+        return item[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
 _default_cache = "redis" if is_prod_env else "memory"
 _cache_method = os.getenv("CHATGPT_PROXY_CACHE_METHOD", _default_cache).lower().strip()
 
@@ -1,11 +1,15 @@
 from . import models
 from . import queries
+from .batch import BatchWriter
+from .db import connect
+from .db import create_pool
 from .db import pool_acquire
-from .db import pool_acquire_many
 
 __all__ = [
     "models",
     "queries",
+    "BatchWriter",
+    "connect",
+    "create_pool",
     "pool_acquire",
-    "pool_acquire_many",
 ]
@@ -0,0 +1,147 @@
+# MIT License
+#
+# Copyright (c) 2025 Tuomo Kriikkula
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Coalescing database writer for high frequency single row inserts."""
+
+import asyncio
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Sequence
+
+from asyncpg import Connection
+from asyncpg import Pool
+
+from chatgpt_proxy.db.db import pool_acquire
+from chatgpt_proxy.log import logger
+
+_default_max_batch_size = 500
+_default_stop_timeout = 5.0
+
+
+class BatchWriter[R]:
+    """Write records from concurrent requests in batches.
+
+    Records written while a previous batch is being flushed are queued
+    and flushed together with a single call to `flush`. If a batch fails,
+    its records are retried one by one, so a single bad record only fails
+    the write that submitted it.
+    """
+
+    def __init__(
+            self,
+            pool: Pool,
+            flush: Callable[[Connection, Sequence[R]], Awaitable[Any]],
+            max_batch_size: int = _default_max_batch_size,
+    ):
+        self._pool = pool
+        self._flush_func = flush
+        self._max_batch_size = max_batch_size
+        self._queue: asyncio.Queue[tuple[R, asyncio.Future[None]] | None] = asyncio.Queue()
+        self._task: asyncio.Task[None] | None = None
+        self._closed = False
+
+    def start(self):
+        if self._task is not None:
+            raise RuntimeError("BatchWriter already started")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = _default_stop_timeout):
+        """Flush all queued records and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put_nowait(None)
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning("BatchWriter: timed out flushing queued records")
+
+    async def write(self, record: R):
+        """Queue record for writing and wait until it has been written."""
+        if self._closed:
+            raise RuntimeError("BatchWriter is stopped")
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((record, fut))
+        await fut
+
+    async def _run(self):
+        stopping = False
+        try:
+            while not stopping:
+                item = await self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                while len(batch) < self._max_batch_size and not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                await self._flush(batch)
+        finally:
+            # Only reached with pending items if we were cancelled.
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None:
+                    item[1].cancel()
+
+    async def _flush(self, batch: list[tuple[R, asyncio.Future[None]]]):
+        try:
+            await self._write_records([record for record, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                _set_exception(batch[0][1], e)
+                return
+            logger.debug("BatchWriter: batch of {} failed: {}: {}, retrying records one by one",
+                         len(batch), type(e).__name__, e)
+            for record, fut in batch:
+                try:
+                    await self._write_records([record])
+                except Exception as e:
+                    _set_exception(fut, e)
+                else:
+                    _set_result(fut)
+        except BaseException:
+            for _, fut in batch:
+                fut.cancel()
+            raise
+        else:
+            for _, fut in batch:
+                _set_result(fut)
+
+    async def _write_records(self, records: Sequence[R]):
+        async with pool_acquire(self._pool) as conn:
+            await self._flush_func(conn, records)
+
+
+def _set_result(fut: asyncio.Future[None]):
+    if not fut.done():
+        fut.set_result(None)
+
+
+def _set_exception(fut: asyncio.Future[None], e: BaseException):
+    if not fut.done():
+        fut.set_exception(e)
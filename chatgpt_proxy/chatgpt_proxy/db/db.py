@@ -22,17 +22,55 @@
 
 """Database connection and caching utilities."""
 
-import asyncio
 from contextlib import asynccontextmanager
+from typing import Any
 from typing import AsyncGenerator
 from typing import cast
 
+import asyncpg
 from asyncpg import Connection
 from asyncpg import Pool
 
-from chatgpt_proxy.log import logger
-
 _default_acquire_timeout = 5.0
+_default_statement_cache_size = 256
+_default_max_cacheable_statement_size = 8 * 1024
+_default_max_inactive_connection_lifetime = 300.0
+# Backstop for statements executed without an explicit timeout.
+_default_command_timeout = 15.0
+# Our queries are tiny OLTP queries, JIT compilation only adds latency to them.
+_default_server_settings = {"jit": "off"}
+
+
+async def create_pool(dsn: str | None, **kwargs: Any) -> Pool:
+    """Create a connection pool with our default settings.
+
+    All queries are either static or fully parametrized, so each one is
+    parsed and planned once per connection and served from asyncpg's
+    statement cache after that.
+    """
+    kwargs.setdefault("statement_cache_size", _default_statement_cache_size)
+    kwargs.setdefault("max_cacheable_statement_size", _default_max_cacheable_statement_size)
+    kwargs.setdefault("max_inactive_connection_lifetime", _default_max_inactive_connection_lifetime)
+    kwargs.setdefault("server_settings", _default_server_settings)
+    kwargs.setdefault("command_timeout", _default_command_timeout)
+    return await asyncpg.create_pool(dsn=dsn, **kwargs)
+
+
+@asynccontextmanager
+async def connect(dsn: str | None, **kwargs: Any) -> AsyncGenerator[Connection]:
+    """Open a single connection with our default settings and close
+    it on exit. Meant for background tasks that only touch the database
+    once in a while and should not keep an idle connection open.
+    """
+    kwargs.setdefault("statement_cache_size", _default_statement_cache_size)
+    kwargs.setdefault("max_cacheable_statement_size", _default_max_cacheable_statement_size)
+    kwargs.setdefault("server_settings", _default_server_settings)
+    kwargs.setdefault("command_timeout", _default_command_timeout)
+    conn: Connection = await asyncpg.connect(dsn=dsn, **kwargs)
+    try:
+        yield conn
+    finally:
+        await conn.close()
 
 
 @asynccontextmanager
@@ -45,27 +83,3 @@ async def pool_acquire(
         # noinspection PyProtectedMember
         _conn = conn._con  # type: ignore[attr-defined]
         yield cast(Connection, _conn)
-
-
-@asynccontextmanager
-async def pool_acquire_many(
-        pool: Pool,
-        count: int,
-        timeout: float = _default_acquire_timeout,
-) -> AsyncGenerator[list[Connection]]:
-    conns: list[Connection] = []
-    try:
-        for _ in range(count):
-            conn_proxy = await pool.acquire(timeout=timeout)
-            # TODO: what is the best way to handle type-juggling here?
-            # noinspection PyProtectedMember
-            conns.append(conn_proxy._con)  # type: ignore[attr-defined]
-        yield conns
-    finally:
-        try:
-            close_tasks = [conn.close(timeout=timeout) for conn in conns]
-            await asyncio.gather(*close_tasks, return_exceptions=True)
-        except Exception as e:
-            logger.debug(
-                "error closing connection: {}: {}",
-                type(e).__name__, e)
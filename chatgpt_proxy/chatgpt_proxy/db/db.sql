@@ -41,15 +41,21 @@ CREATE INDEX ON "game_server_api_key" (api_key_hash);
 -- Server game session. A new one begins on map change.
 CREATE TABLE IF NOT EXISTS "game"
 (
-    id                          TEXT PRIMARY KEY,
-    level                       TEXT        NOT NULL,
-    start_time                  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-    stop_time                   TIMESTAMPTZ,
-    game_server_address         INET        NOT NULL,
-    game_server_port            INTEGER     NOT NULL,
-    openai_previous_response_id TEXT
+    id                            TEXT PRIMARY KEY,
+    level                         TEXT        NOT NULL,
+    start_time                    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    stop_time                     TIMESTAMPTZ,
+    game_server_address           INET        NOT NULL,
+    game_server_port              INTEGER     NOT NULL,
+    openai_previous_response_id   TEXT,
+    -- Time of the OpenAI query that produced openai_previous_response_id.
+    openai_previous_response_time TIMESTAMPTZ
 );
 
+-- Added after the initial schema, for existing databases.
+ALTER TABLE "game"
+    ADD COLUMN IF NOT EXISTS openai_previous_response_time TIMESTAMPTZ;
+
 -- Chat messages belonging to a specific game session sent by players.
 -- Intentionally not tied to player ID, since the "game_player" table
 -- represents the latest known game state (scoreboard), NOT all current
@@ -130,6 +136,9 @@ CREATE TABLE IF NOT EXISTS "openai_query"
     request_length      INTEGER     NOT NULL,
     response_length     INTEGER     NOT NULL,
     openai_response_id  TEXT        NOT NULL,
+    -- True if the response was served from the proxy's own cache
+    -- and no request was actually sent to OpenAI.
+    cached              BOOLEAN     NOT NULL DEFAULT FALSE,
 
     FOREIGN KEY (game_id) REFERENCES game (id) ON DELETE CASCADE
 );
@@ -147,3 +156,15 @@ ALTER TABLE "openai_query"
         );
 
 SELECT add_compression_policy('openai_query', INTERVAL '2 days', if_not_exists => TRUE);
+
+-- Added after the initial schema, for existing databases.
+ALTER TABLE "openai_query"
+    ADD COLUMN IF NOT EXISTS cached BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Backfill game.openai_previous_response_time for games created before
+-- the column existed, from the query that produced the previous response.
+UPDATE "game" g
+SET openai_previous_response_time = q.time
+FROM "openai_query" q
+WHERE g.openai_previous_response_time IS NULL
+  AND q.openai_response_id = g.openai_previous_response_id;
@@ -31,6 +31,10 @@ import datetime
 import ipaddress
 from dataclasses import dataclass
 from enum import StrEnum
+from typing import Any
+from typing import ClassVar
+
+import ujson
 
 max_ast_literal_eval_size = 1000
 
@@ -49,6 +53,9 @@ class Team(StrEnum):
     Neutral = "3"
 
 
+_team_by_int: dict[int, Team] = {int(team): team for team in Team}
+
+
 @dataclass(slots=True, frozen=True)
 class Game:
     id: str
@@ -58,6 +65,24 @@ class Game:
     game_server_port: int
     stop_time: datetime.datetime | None = None
     openai_previous_response_id: str | None = None
+    openai_previous_response_time: datetime.datetime | None = None
+
+    def as_json_dict(self) -> dict[str, Any]:
+        stop_time = self.stop_time
+        openai_previous_response_time = self.openai_previous_response_time
+        return {
+            "id": self.id,
+            "level": self.level,
+            "start_time": self.start_time.isoformat(),
+            "game_server_address": str(self.game_server_address),
+            "game_server_port": self.game_server_port,
+            "stop_time": stop_time.isoformat() if stop_time else None,
+            "openai_previous_response_id": self.openai_previous_response_id,
+            "openai_previous_response_time": (
+                openai_previous_response_time.isoformat()
+                if openai_previous_response_time else None
+            ),
+        }
 
 
 @dataclass(slots=True, frozen=True)
@@ -68,12 +93,13 @@ class GamePlayer:
     team: Team
     score: int
 
+    markdown_columns: ClassVar[tuple[str, ...]] = ("Name", "Team:", "Score:")
+
+    def as_markdown_row(self) -> tuple[Any, ...]:
+        return self.name, self.team.name, self.score
+
     def as_markdown_dict(self) -> dict:
-        return {
-            "Name": self.name,
-            "Team:": self.team.name,
-            "Score:": self.score,
-        }
+        return dict(zip(self.markdown_columns, self.as_markdown_row()))
 
     def wire_format(self) -> str:
         return f"{self.name}\n{self.team}\n{self.score}"
@@ -88,6 +114,7 @@ class OpenAIQuery:
     request_length: int
     response_length: int
     openai_response_id: str
+    cached: bool = False
 
 
 @dataclass(slots=True, frozen=True)
@@ -100,13 +127,13 @@ class GameChatMessage:
     sender_team: Team
     channel: SayType
 
+    markdown_columns: ClassVar[tuple[str, ...]] = ("Message", "Sender:", "Team:", "Channel:")
+
+    def as_markdown_row(self) -> tuple[Any, ...]:
+        return self.message, self.sender_name, self.sender_team, self.channel
+
     def as_markdown_dict(self) -> dict:
-        return {
-            "Message": self.message,
-            "Sender:": self.sender_name,
-            "Team:": self.sender_team,
-            "Channel:": self.channel,
-        }
+        return dict(zip(self.markdown_columns, self.as_markdown_row()))
 
     def wire_format(self) -> str:
         return f"{self.sender_name}\n{self.sender_team}\n{self.channel}\n{self.message}"
@@ -129,31 +156,50 @@ class GameObjectiveState:
     objectives: list[GameObjective]
 
     def wire_format(self) -> str:
-        # TODO: too many quotes with this method!
-        return str([(obj.name, int(obj.team_state)) for obj in self.objectives])
+        return ujson.dumps(
+            [[obj.name, int(obj.team_state)] for obj in self.objectives],
+            ensure_ascii=False,
+        )
 
     @staticmethod
     def from_wire_format(
             game_id: str,
-            wire_format_data: str,
+            wire_format_data: str | bytes,
     ) -> "GameObjectiveState":
+        """Parse objective state from JSON: [["Objective A",0],...].
+        The legacy Python literal format sent by older mutator
+        versions, [("Objective A",0),...], is also accepted.
+        """
         if len(wire_format_data) > max_ast_literal_eval_size:
             raise ValueError("wire_format_data too long")
 
-        raw_objs: list[tuple[str, int]] = ast.literal_eval(wire_format_data)
+        raw_objs: list[tuple[str, int]]
+        try:
+            raw_objs = ujson.loads(wire_format_data)
+        except ValueError:
+            if isinstance(wire_format_data, bytes):
+                wire_format_data = wire_format_data.decode("utf-8")
+            raw_objs = ast.literal_eval(wire_format_data)
 
-        t = type(raw_objs)
-        if t is not list:
-            raise ValueError(f"objs: expected list type, got {t}")
+        if type(raw_objs) is not list:
+            raise ValueError(f"objs: expected list type, got {type(raw_objs)}")
 
         objs = []
-        for obj_name, obj_state in raw_objs:
+        for raw_obj in raw_objs:
+            t = type(raw_obj)
+            if (t is not list and t is not tuple) or len(raw_obj) != 2:
+                raise ValueError(f"obj: expected [name, state] pair, got {raw_obj!r}")
+
+            obj_name, obj_state = raw_obj
             if type(obj_name) is not str:
                 raise ValueError(f"obj_name: expected str type, got {type(obj_name)}")
             if type(obj_state) is not int:
                 raise ValueError(f"obj_state: expected int type, got {type(obj_state)}")
 
-            obj_state_enum = Team(str(obj_state))
+            try:
+                obj_state_enum = _team_by_int[obj_state]
+            except KeyError:
+                raise ValueError(f"obj_state: invalid team state: {obj_state}") from None
 
             objs.append(GameObjective(
                 name=obj_name,
@@ -178,14 +224,26 @@ class GameKill:
     damage_type: str
     kill_distance_m: float
 
-    def as_markdown_dict(self) -> dict:
+    markdown_columns: ClassVar[tuple[str, ...]] = (
+        "Killer",
+        "Victim",
+        "Killer Team:",
+        "Victim Team:",
+        "Damage Type:",
+        "Kill Distance (m):",
+    )
+
+    def as_markdown_row(self) -> tuple[Any, ...]:
         # TODO: also do this for other well known damage type prefixes?
         dmg_type = self.damage_type.replace("RODmgType_", "")
-        return {
-            "Killer": self.killer_name,
-            "Victim": self.victim_name,
-            "Killer Team:": self.killer_team,
-            "Victim Team:": self.victim_team,
-            "Damage Type:": dmg_type,
-            "Kill Distance (m):": round(self.kill_distance_m, 1),
-        }
+        return (
+            self.killer_name,
+            self.victim_name,
+            self.killer_team,
+            self.victim_team,
+            dmg_type,
+            round(self.kill_distance_m, 1),
+        )
+
+    def as_markdown_dict(self) -> dict:
+        return dict(zip(self.markdown_columns, self.as_markdown_row()))
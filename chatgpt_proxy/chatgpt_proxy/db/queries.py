@@ -24,10 +24,14 @@
 
 import datetime
 import ipaddress
+from typing import Any
+from typing import Sequence
+from typing import TypeAlias
 
 from asyncpg import Connection
 from asyncpg import Record
 from pypika import Order
+from pypika import Parameter
 from pypika import Table
 from pypika.queries import QueryBuilder
 
@@ -43,9 +47,26 @@ class Ignored:
 IGNORED = Ignored()
 
 
+def _param(args: list[Any], value: Any) -> Parameter:
+    """Add value to query args and return a placeholder for it.
+    Keeping values out of the query string lets asyncpg reuse
+    the cached prepared statement for dynamically built queries.
+    """
+    args.append(value)
+    return Parameter(f"${len(args)}")
+
+
 # TODO: add caching layer!
 
 
+insert_game_sql = """
+INSERT INTO "game"
+(id, level, start_time, stop_time, game_server_address,
+ game_server_port, openai_previous_response_id, openai_previous_response_time)
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8);
+"""
+
+
 async def insert_game(
         conn: Connection,
         game_id: str,
@@ -55,15 +76,11 @@ async def insert_game(
         start_time: datetime.datetime,
         stop_time: datetime.datetime | None = None,
         openai_previous_response_id: str | None = None,
+        openai_previous_response_time: datetime.datetime | None = None,
         timeout: float | None = _default_conn_timeout,
 ):
     await conn.execute(
-        """
-        INSERT INTO "game"
-        (id, level, start_time, stop_time, game_server_address,
-         game_server_port, openai_previous_response_id)
-        VALUES ($1, $2, $3, $4, $5, $6, $7);
-        """,
+        insert_game_sql,
         game_id,
         level,
         start_time,
@@ -71,6 +88,54 @@ async def insert_game(
         game_server_address,
         game_server_port,
         openai_previous_response_id,
+        openai_previous_response_time,
+        timeout=timeout,
+    )
+
+
+insert_game_and_openai_query_sql = """
+WITH game AS (
+    INSERT INTO "game"
+    (id, level, start_time, stop_time, game_server_address,
+     game_server_port, openai_previous_response_id, openai_previous_response_time)
+    VALUES ($1, $2, $3, NULL, $4, $5, $6, $3)
+)
+INSERT INTO "openai_query"
+(game_id, time, game_server_address,
+ game_server_port, request_length, response_length, openai_response_id, cached)
+VALUES ($1, $3, $4, $5, $7, $8, $6, $9);
+"""
+
+
+async def insert_game_and_openai_query(
+        conn: Connection,
+        game_id: str,
+        level: str,
+        game_server_address: ipaddress.IPv4Address,
+        game_server_port: int,
+        time: datetime.datetime,
+        request_length: int,
+        response_length: int,
+        openai_response_id: str,
+        cached: bool = False,
+        timeout: float | None = _default_conn_timeout,
+) -> None:
+    """Insert a new game started at time along with its initial query,
+    which also becomes the previous response of the game, atomically
+    in a single statement. Set cached if the response was served from
+    the proxy's cache instead of OpenAI.
+    """
+    await conn.execute(
+        insert_game_and_openai_query_sql,
+        game_id,
+        level,
+        time,
+        game_server_address,
+        game_server_port,
+        openai_response_id,
+        request_length,
+        response_length,
+        cached,
         timeout=timeout,
     )
 
@@ -79,15 +144,25 @@ def build_update_game_query(
         game_id: str,
         stop_time: datetime.datetime | Ignored = IGNORED,
         openai_previous_response_id: str | Ignored = IGNORED,
-) -> QueryBuilder:
+        openai_previous_response_time: datetime.datetime | Ignored = IGNORED,
+) -> tuple[QueryBuilder, list[Any]]:
+    args: list[Any] = []
     game = Table(name="game")
     query = game.update()
     if stop_time is not IGNORED:
-        query = query.set(game.stop_time, stop_time)
+        query = query.set(game.stop_time, _param(args, stop_time))
     if openai_previous_response_id is not IGNORED:
-        query = query.set(game.openai_previous_response_id, openai_previous_response_id)
-    query = query.where(game.id == game_id)
-    return query
+        query = query.set(
+            game.openai_previous_response_id,
+            _param(args, openai_previous_response_id),
+        )
+    if openai_previous_response_time is not IGNORED:
+        query = query.set(
+            game.openai_previous_response_time,
+            _param(args, openai_previous_response_time),
+        )
+    query = query.where(game.id == _param(args, game_id))
+    return query, args
 
 
 async def update_game(
@@ -95,14 +170,56 @@ async def update_game(
         game_id: str,
         stop_time: datetime.datetime | Ignored = IGNORED,
         openai_previous_response_id: str | Ignored = IGNORED,
+        openai_previous_response_time: datetime.datetime | Ignored = IGNORED,
         timeout: float | None = _default_conn_timeout,
 ):
-    query = build_update_game_query(
+    query, args = build_update_game_query(
         game_id=game_id,
         stop_time=stop_time,
         openai_previous_response_id=openai_previous_response_id,
+        openai_previous_response_time=openai_previous_response_time,
+    )
+    await conn.execute(str(query), *args, timeout=timeout)
+
+
+update_game_stop_time_sql = """
+UPDATE "game"
+SET stop_time = start_time + make_interval(secs => $1)
+WHERE id = $2
+  AND game_server_address = $3
+  AND game_server_port = $4
+RETURNING id;
+"""
+
+
+async def update_game_stop_time(
+        conn: Connection,
+        game_id: str,
+        world_time: float,
+        game_server_address: ipaddress.IPv4Address,
+        game_server_port: int,
+        timeout: float | None = _default_conn_timeout,
+) -> bool:
+    """Set game stop time to world_time seconds after its start time.
+    Returns False if the game does not exist or does not belong to the
+    given game server.
+    """
+    game_id = await conn.fetchval(
+        update_game_stop_time_sql,
+        world_time,
+        game_id,
+        game_server_address,
+        game_server_port,
+        timeout=timeout,
     )
-    await conn.execute(str(query), timeout=timeout)
+    return game_id is not None
+
+
+select_game_sql = """
+SELECT *
+FROM "game"
+WHERE id = $1;
+"""
 
 
 # TODO: what's the best way to handle this? If we make this too dynamic
@@ -115,11 +232,7 @@ async def select_game(
         timeout: float | None = _default_conn_timeout,
 ) -> models.Game | None:
     record = await conn.fetchrow(
-        """
-        SELECT *
-        FROM "game"
-        WHERE id = $1;
-        """,
+        select_game_sql,
         game_id,
         timeout=timeout,
     )
@@ -130,16 +243,19 @@ async def select_game(
     return None
 
 
+select_games_sql = """
+SELECT *
+FROM "game";
+"""
+
+
 # TODO: select * or do we need a way to specify columns?
 async def select_games(
         conn: Connection,
         timeout: float | None = _default_conn_timeout,
 ) -> list[models.Game]:
     games = await conn.fetch(
-        """
-        SELECT *
-        FROM "game";
-        """,
+        select_games_sql,
         timeout=timeout,
     )
     return [
@@ -148,6 +264,15 @@ async def select_games(
     ]
 
 
+upsert_game_objective_state_sql = """
+INSERT INTO "game_objective_state" (game_id, objectives)
+VALUES ($1, $2)
+ON CONFLICT (game_id) DO UPDATE
+    SET objectives = excluded.objectives
+RETURNING (xmax = 0) as inserted;
+"""
+
+
 async def upsert_game_objective_state(
         conn: Connection,
         state: models.GameObjectiveState,
@@ -157,13 +282,7 @@ async def upsert_game_objective_state(
     objectives_db_fmt = [obj.wire_format() for obj in state.objectives]
 
     inserted = await conn.fetchval(
-        """
-        INSERT INTO "game_objective_state" (game_id, objectives)
-        VALUES ($1, $2)
-        ON CONFLICT (game_id) DO UPDATE
-            SET objectives = excluded.objectives
-        RETURNING (xmax = 0) as inserted;
-        """,
+        upsert_game_objective_state_sql,
         state.game_id,
         objectives_db_fmt,
         timeout=timeout,
@@ -171,23 +290,34 @@ async def upsert_game_objective_state(
     return bool(inserted)
 
 
+delete_completed_games_sql = """
+DELETE
+FROM "game"
+WHERE stop_time IS NOT NULL
+   OR NOW() > (stop_time + $1);
+"""
+
+
 async def delete_completed_games(
         conn: Connection,
         game_expiration: datetime.timedelta,
         timeout: float | None = _default_conn_timeout,
 ) -> str:
     return await conn.execute(
-        """
-        DELETE
-        FROM "game"
-        WHERE stop_time IS NOT NULL
-           OR NOW() > (stop_time + $1);
-        """,
+        delete_completed_games_sql,
         game_expiration,
         timeout=timeout,
     )
 
 
+select_game_server_api_key_sql = """
+SELECT *
+FROM "game_server_api_key"
+WHERE game_server_address = $1
+  AND game_server_port = $2;
+"""
+
+
 # TODO: add the rest of cols here if needed?
 async def select_game_server_api_key(
         conn: Connection,
@@ -196,31 +326,36 @@ async def select_game_server_api_key(
         timeout: float | None = _default_conn_timeout,
 ) -> Record | None:
     return await conn.fetchrow(
-        """
-        SELECT *
-        FROM "game_server_api_key"
-        WHERE game_server_address = $1
-          AND game_server_port = $2;
-        """,
+        select_game_server_api_key_sql,
         game_server_address,
         game_server_port,
         timeout=timeout,
     )
 
 
+select_game_server_api_keys_sql = """
+SELECT *
+FROM "game_server_api_key";
+"""
+
+
 async def select_game_server_api_keys(
         conn: Connection,
         timeout: float | None = _default_conn_timeout,
 ) -> list[Record]:
     return await conn.fetch(
-        """
-        SELECT *
-        FROM "game_server_api_key";
-        """,
+        select_game_server_api_keys_sql,
         timeout=timeout,
     )
 
 
+insert_game_server_api_key_sql = """
+INSERT INTO "game_server_api_key"
+(created_at, expires_at, api_key_hash, game_server_address, game_server_port, name)
+VALUES ($1, $2, $3, $4, $5, $6);
+"""
+
+
 async def insert_game_server_api_key(
         conn: Connection,
         issued_at: datetime.datetime,
@@ -232,11 +367,7 @@ async def insert_game_server_api_key(
         timeout: float | None = _default_conn_timeout,
 ):
     await conn.execute(
-        """
-        INSERT INTO "game_server_api_key"
-        (created_at, expires_at, api_key_hash, game_server_address, game_server_port, name)
-        VALUES ($1, $2, $3, $4, $5, $6);
-        """,
+        insert_game_server_api_key_sql,
         issued_at,
         expires_at,
         token_hash,
@@ -247,38 +378,51 @@ async def insert_game_server_api_key(
     )
 
 
+game_exists_sql = """
+SELECT 1
+FROM "game"
+WHERE id = $1;
+"""
+
+
 async def game_exists(
         conn: Connection,
         game_id: str,
         timeout: float | None = _default_conn_timeout,
 ) -> bool:
     return await conn.fetchval(
-        """
-        SELECT 1
-        FROM "game"
-        WHERE id = $1;
-        """,
+        game_exists_sql,
         game_id,
         timeout=timeout,
     ) is not None
 
 
+delete_old_api_keys_sql = """
+DELETE
+FROM "game_server_api_key"
+WHERE NOW() > (expires_at + $1);
+"""
+
+
 async def delete_old_api_keys(
         conn: Connection,
         leeway: datetime.timedelta,
         timeout: float | None = _default_conn_timeout,
 ) -> str:
     return await conn.execute(
-        """
-        DELETE
-        FROM "game_server_api_key"
-        WHERE NOW() > (expires_at + $1);
-        """,
+        delete_old_api_keys_sql,
         leeway,
         timeout=timeout,
     )
 
 
+select_openai_query_sql = """
+SELECT *
+FROM "openai_query"
+WHERE openai_response_id = $1;
+"""
+
+
 async def select_openai_query(
         conn: Connection,
         openai_response_id: str,
@@ -286,11 +430,7 @@ async def select_openai_query(
 ) -> models.OpenAIQuery | None:
     """NOTE: for now, assuming we only want to select by openai_response_id."""
     record = await conn.fetchrow(
-        """
-        SELECT *
-        FROM "openai_query"
-        WHERE openai_response_id = $1;
-        """,
+        select_openai_query_sql,
         openai_response_id,
         timeout=timeout,
     )
@@ -301,6 +441,14 @@ async def select_openai_query(
     return models.OpenAIQuery(**record)
 
 
+insert_openai_query_sql = """
+INSERT INTO "openai_query"
+(game_id, time, game_server_address,
+ game_server_port, request_length, response_length, openai_response_id)
+VALUES ($1, $2, $3, $4, $5, $6, $7);
+"""
+
+
 async def insert_openai_query(
         conn: Connection,
         game_id: str,
@@ -313,12 +461,7 @@ async def insert_openai_query(
         timeout: float | None = _default_conn_timeout,
 ) -> None:
     await conn.execute(
-        """
-        INSERT INTO "openai_query"
-        (game_id, time, game_server_address,
-         game_server_port, request_length, response_length, openai_response_id)
-        VALUES ($1, $2, $3, $4, $5, $6, $7);
-        """,
+        insert_openai_query_sql,
         game_id,
         time,
         game_server_address,
@@ -330,6 +473,55 @@ async def insert_openai_query(
     )
 
 
+insert_openai_query_and_update_game_sql = """
+WITH query AS (
+    INSERT INTO "openai_query"
+    (game_id, time, game_server_address,
+     game_server_port, request_length, response_length, openai_response_id)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+)
+UPDATE "game"
+SET openai_previous_response_id   = $7,
+    openai_previous_response_time = $2
+WHERE id = $1;
+"""
+
+
+async def insert_openai_query_and_update_game(
+        conn: Connection,
+        game_id: str,
+        time: datetime.datetime,
+        game_server_address: ipaddress.IPv4Address,
+        game_server_port: int,
+        request_length: int,
+        response_length: int,
+        openai_response_id: str,
+        timeout: float | None = _default_conn_timeout,
+) -> None:
+    """Insert the query and make it the previous response of the game,
+    atomically in a single statement.
+    """
+    await conn.execute(
+        insert_openai_query_and_update_game_sql,
+        game_id,
+        time,
+        game_server_address,
+        game_server_port,
+        request_length,
+        response_length,
+        openai_response_id,
+        timeout=timeout,
+    )
+
+
+insert_game_chat_message_sql = """
+INSERT INTO "game_chat_message"
+    (message, game_id, send_time, sender_name, sender_team, channel)
+VALUES ($1, $2, $3, $4, $5, $6)
+RETURNING id;
+"""
+
+
 async def insert_game_chat_message(
         conn: Connection,
         game_id: str,
@@ -344,12 +536,7 @@ async def insert_game_chat_message(
     _channel = int(channel)
 
     return await conn.fetchval(
-        """
-        INSERT INTO "game_chat_message"
-            (message, game_id, send_time, sender_name, sender_team, channel)
-        VALUES ($1, $2, $3, $4, $5, $6)
-        RETURNING id;
-        """,
+        insert_game_chat_message_sql,
         message,
         game_id,
         send_time,
@@ -360,6 +547,15 @@ async def insert_game_chat_message(
     )
 
 
+insert_game_kill_sql = """
+INSERT INTO "game_kill"
+(game_id, kill_time, killer_name, victim_name, killer_team,
+ victim_team, damage_type, kill_distance_m)
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+RETURNING id;
+"""
+
+
 async def insert_game_kill(
         conn: Connection,
         game_id: str,
@@ -376,13 +572,7 @@ async def insert_game_kill(
     _victim_team = int(victim_team)
 
     return await conn.fetchval(
-        """
-        INSERT INTO "game_kill"
-        (game_id, kill_time, killer_name, victim_name, killer_team,
-         victim_team, damage_type, kill_distance_m)
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-        RETURNING id;
-        """,
+        insert_game_kill_sql,
         game_id,
         kill_time,
         killer_name,
@@ -395,6 +585,58 @@ async def insert_game_kill(
     )
 
 
+# (game_id, kill_time, killer_name, victim_name, killer_team,
+#  victim_team, damage_type, kill_distance_m)
+GameKillRecord: TypeAlias = tuple[str, datetime.datetime, str, str, int, int, str, float]
+
+game_kill_copy_columns = (
+    "game_id", "kill_time", "killer_name", "victim_name", "killer_team",
+    "victim_team", "damage_type", "kill_distance_m",
+)
+
+
+async def copy_game_kills(
+        conn: Connection,
+        records: Sequence[GameKillRecord],
+        timeout: float | None = _default_conn_timeout,
+):
+    await conn.copy_records_to_table(
+        "game_kill",
+        records=records,
+        columns=game_kill_copy_columns,
+        timeout=timeout,
+    )
+
+
+# (message, game_id, send_time, sender_name, sender_team, channel)
+GameChatMessageRecord: TypeAlias = tuple[str, str, datetime.datetime, str, int, int]
+
+game_chat_message_copy_columns = (
+    "message", "game_id", "send_time", "sender_name", "sender_team", "channel",
+)
+
+
+async def copy_game_chat_messages(
+        conn: Connection,
+        records: Sequence[GameChatMessageRecord],
+        timeout: float | None = _default_conn_timeout,
+):
+    await conn.copy_records_to_table(
+        "game_chat_message",
+        records=records,
+        columns=game_chat_message_copy_columns,
+        timeout=timeout,
+    )
+
+
+delete_game_player_sql = """
+DELETE
+FROM "game_player"
+WHERE game_id = $1
+  AND id = $2;
+"""
+
+
 async def delete_game_player(
         conn: Connection,
         game_id: str,
@@ -402,18 +644,25 @@ async def delete_game_player(
         timeout: float | None = _default_conn_timeout,
 ):
     await conn.execute(
-        """
-        DELETE
-        FROM "game_player"
-        WHERE game_id = $1
-          AND id = $2;
-        """,
+        delete_game_player_sql,
         game_id,
         player_id,
         timeout=timeout,
     )
 
 
+upsert_game_player_sql = """
+INSERT INTO "game_player" (game_id, id, name, team, score)
+VALUES ($1, $2, $3, $4, $5)
+ON CONFLICT (game_id, id) DO UPDATE
+    SET game_id = excluded.game_id,
+        name    = excluded.name,
+        team    = excluded.team,
+        score   = excluded.score
+RETURNING (xmax = 0) as inserted;
+"""
+
+
 async def upsert_game_player(
         conn: Connection,
         game_id: str,
@@ -424,16 +673,7 @@ async def upsert_game_player(
         timeout: float | None = _default_conn_timeout,
 ) -> bool:
     inserted = await conn.fetchval(
-        """
-        INSERT INTO "game_player" (game_id, id, name, team, score)
-        VALUES ($1, $2, $3, $4, $5)
-        ON CONFLICT (game_id, id) DO UPDATE
-            SET game_id = excluded.game_id,
-                name    = excluded.name,
-                team    = excluded.team,
-                score   = excluded.score
-        RETURNING (xmax = 0) as inserted;
-        """,
+        upsert_game_player_sql,
         game_id,
         player_id,
         name,
@@ -444,17 +684,20 @@ async def upsert_game_player(
     return bool(inserted)
 
 
+select_game_players_sql = """
+SELECT *
+FROM "game_player"
+WHERE game_id = $1;
+"""
+
+
 async def select_game_players(
         conn: Connection,
         game_id: str,
         timeout: float | None = _default_conn_timeout,
 ) -> list[models.GamePlayer]:
     records = await conn.fetch(
-        """
-        SELECT *
-        FROM "game_player"
-        WHERE game_id = $1;
-        """,
+        select_game_players_sql,
         game_id,
         timeout=timeout,
     )
@@ -465,6 +708,14 @@ async def select_game_players(
     ]
 
 
+select_game_player_sql = """
+SELECT *
+FROM "game_player"
+WHERE game_id = $1
+  AND id = $2;
+"""
+
+
 async def select_game_player(
         conn: Connection,
         game_id: str,
@@ -472,12 +723,7 @@ async def select_game_player(
         timeout: float | None = _default_conn_timeout,
 ) -> models.GamePlayer | None:
     record = await conn.fetchrow(
-        """
-        SELECT *
-        FROM "game_player"
-        WHERE game_id = $1
-          AND id = $2;
-        """,
+        select_game_player_sql,
         game_id,
         player_id,
         timeout=timeout,
@@ -495,6 +741,14 @@ async def select_game_player(
     )
 
 
+game_player_exists_sql = """
+SELECT 1
+FROM "game_player"
+WHERE game_id = $1
+  AND id = $2;
+"""
+
+
 async def game_player_exists(
         conn: Connection,
         game_id: str,
@@ -502,12 +756,7 @@ async def game_player_exists(
         timeout: float | None = _default_conn_timeout,
 ) -> bool:
     return await conn.fetchval(
-        """
-        SELECT 1
-        FROM "game_player"
-        WHERE game_id = $1
-          AND id = $2;
-        """,
+        game_player_exists_sql,
         game_id,
         player_id,
         timeout=timeout,
@@ -521,18 +770,20 @@ async def select_game_kills(
         limit: int | None = None,
         timeout: float | None = _default_conn_timeout,
 ) -> list[models.GameKill]:
+    args: list[Any] = []
     game_kill = Table(name="game_kill")
     query = game_kill.select("*")
     if game_id is not None:
-        query = query.where(game_kill.game_id == game_id)
+        query = query.where(game_kill.game_id == _param(args, game_id))
     if kill_time_from is not None:
-        query = query.where(game_kill.kill_time >= kill_time_from)
+        query = query.where(game_kill.kill_time >= _param(args, kill_time_from))
     if limit is not None:
         query = query.limit(limit)
     query = query.orderby("id", order=Order.asc)
 
     records = await conn.fetch(
         str(query),
+        *args,
         timeout=timeout,
     )
 
@@ -549,18 +800,20 @@ async def select_game_chat_messages(
         limit: int | None = None,
         timeout: float | None = _default_conn_timeout,
 ) -> list[models.GameChatMessage]:
+    args: list[Any] = []
     game_chat_message = Table(name="game_chat_message")
     query = game_chat_message.select("*")
     if game_id is not None:
-        query = query.where(game_chat_message.game_id == game_id)
+        query = query.where(game_chat_message.game_id == _param(args, game_id))
     if send_time_from is not None:
-        query = query.where(game_chat_message.send_time >= send_time_from)
+        query = query.where(game_chat_message.send_time >= _param(args, send_time_from))
     if limit is not None:
         query = query.limit(limit)
     query = query.orderby("id", order=Order.asc)
 
     records = await conn.fetch(
         str(query),
+        *args,
         timeout=timeout,
     )
 
@@ -570,19 +823,78 @@ async def select_game_chat_messages(
     ]
 
 
+select_game_kills_and_chat_messages_sql = """
+SELECT ARRAY(SELECT k
+             FROM "game_kill" k
+             WHERE k.game_id = $1
+               AND k.kill_time >= $2
+             ORDER BY k.id
+             LIMIT $3) AS kills,
+       ARRAY(SELECT m
+             FROM "game_chat_message" m
+             WHERE m.game_id = $1
+               AND m.send_time >= $2
+             ORDER BY m.id
+             LIMIT $4) AS chat_messages;
+"""
+
+
+async def select_game_kills_and_chat_messages(
+        conn: Connection,
+        game_id: str,
+        time_from: datetime.datetime,
+        kills_limit: int,
+        chat_messages_limit: int,
+        timeout: float | None = _default_conn_timeout,
+) -> tuple[list[models.GameKill], list[models.GameChatMessage]]:
+    """Select the kills and chat messages of a game starting from
+    time_from in a single round-trip. The rows are returned as arrays
+    of the tables' composite types, which asyncpg decodes into records.
+    """
+    record = await conn.fetchrow(
+        select_game_kills_and_chat_messages_sql,
+        game_id,
+        time_from,
+        kills_limit,
+        chat_messages_limit,
+        timeout=timeout,
+    )
+
+    if not record:
+        return [], []
+
+    kills = [
+        models.GameKill(**kill)
+        for kill in record["kills"]
+    ]
+    chat_messages = [
+        models.GameChatMessage(**msg)
+        for msg in record["chat_messages"]
+    ]
+    return kills, chat_messages
+
+
+increment_steam_web_api_queries_sql = """
+UPDATE "query_statistics"
+SET steam_web_api_queries    = steam_web_api_queries + 1,
+    last_steam_web_api_query = NOW();
+"""
+
+
 async def increment_steam_web_api_queries(
         conn: Connection,
         timeout: float | None = _default_conn_timeout,
 ) -> None:
-    async with conn.transaction():
-        await conn.execute(
-            """
-            UPDATE "query_statistics"
-            SET steam_web_api_queries    = steam_web_api_queries + 1,
-                last_steam_web_api_query = NOW();
-            """,
-            timeout=timeout,
-        )
+    await conn.execute(
+        increment_steam_web_api_queries_sql,
+        timeout=timeout,
+    )
+
+
+select_steam_web_api_queries_sql = """
+SELECT steam_web_api_queries
+FROM "query_statistics";
+"""
 
 
 async def select_steam_web_api_queries(
@@ -590,10 +902,7 @@ async def select_steam_web_api_queries(
         timeout: float | None = _default_conn_timeout,
 ) -> int:
     record = await conn.fetchrow(
-        """
-        SELECT steam_web_api_queries
-        FROM "query_statistics";
-        """,
+        select_steam_web_api_queries_sql,
         timeout=timeout,
     )
     if not record:
@@ -24,14 +24,29 @@
 # TODO: we'll probably want to inject Sanic client IP/port in this logger too?
 
 import logging
+import os
 import sys
 
 from loguru import logger
 
+# NOTE: chatgpt_proxy.utils.is_prod_env can't be imported here (circular import).
+_default_log_level = "INFO" if "FLY_APP_NAME" in os.environ else "DEBUG"
+log_level = os.environ.get("CHATGPT_PROXY_LOG_LEVEL", _default_log_level)
+
 logger.remove()
 
 # TODO: sync context with Sanic!
-logger.add(sys.stdout, enqueue=True, context="spawn")
+# The sink is written from a background thread so logging never blocks
+# the event loop. Diagnose is disabled to avoid dumping local variables
+# (API keys, tokens) in exception traces.
+logger.add(
+    sys.stdout,
+    level=log_level,
+    enqueue=True,
+    context="spawn",
+    backtrace=False,
+    diagnose=False,
+)
 
 logger = logger
 
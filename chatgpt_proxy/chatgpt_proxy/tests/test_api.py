@@ -25,6 +25,7 @@ import datetime
 import hashlib
 import ipaddress
 import logging
+import math
 import os
 from typing import AsyncGenerator
 
@@ -49,10 +50,12 @@ setup.common_test_setup()
 import chatgpt_proxy  # noqa: E402
 from chatgpt_proxy import auth  # noqa: E402
 from chatgpt_proxy.app import app  # noqa: E402
+from chatgpt_proxy.app import clear_caches as clear_app_caches  # noqa: E402
 from chatgpt_proxy.app import game_id_length  # noqa: E402
 from chatgpt_proxy.app import make_api_v1_app  # noqa: E402
 from chatgpt_proxy.app import max_ast_literal_eval_size  # noqa: E402
 from chatgpt_proxy.app import openai_model  # noqa: E402
+from chatgpt_proxy.app import sanitize_level_name  # noqa: E402
 from chatgpt_proxy.cache import app_cache  # noqa: E402
 from chatgpt_proxy.db import models  # noqa: E402
 from chatgpt_proxy.db import pool_acquire  # noqa: E402
@@ -239,6 +242,9 @@ async def api_fixture(
                 name="pytest API key (forbidden game server)",
             )
 
+        auth.clear_caches()
+        clear_app_caches()
+
         app.asgi_client.headers = _headers
         app.asgi_client.loop = loop
 
@@ -343,12 +349,61 @@ async def test_api_v1_post_game(api_fixture, caplog) -> None:
     assert resp.status == 201
 
     game_id, greeting = resp.text.split("\n")
-    assert len(game_id) == game_id_length * 2  # Num bytes as hex string.
+    # Num bytes as unpadded base64 string.
+    assert len(game_id) == math.ceil(game_id_length * 4 / 3)
 
     req, resp = reusable_client.get(f"/api/v1/game/{game_id}")
     assert resp.status == 200
     game = resp.json
     assert game
+    assert game["openai_previous_response_id"] == "testing_0"
+
+    def num_openai_calls() -> int:
+        return sum(
+            call.request.url.path == "/v1/responses" for call in openai_mock_router.calls)
+
+    cached_sql = 'SELECT cached FROM "openai_query" WHERE game_id = $1'
+
+    # Initial response cache is disabled by default -> OpenAI is queried again.
+    calls_before = num_openai_calls()
+    assert calls_before > 0
+    data = "VNTE-TestSuite\nTest Suite\n7777"
+    req, resp = reusable_client.post("/api/v1/game", data=data)
+    assert resp.status == 201
+    game_id_2, _ = resp.text.split("\n")
+    assert num_openai_calls() == calls_before + 1
+    assert await db_conn.fetchval(cached_sql, game_id) is False
+    assert await db_conn.fetchval(cached_sql, game_id_2) is False
+
+    try:
+        chatgpt_proxy.app.initial_response_cache_enabled = True
+
+        # First request fills the cache, the second one reuses it.
+        req, resp = reusable_client.post("/api/v1/game", data=data)
+        assert resp.status == 201
+        game_id_3, greeting_3 = resp.text.split("\n")
+        calls_before = num_openai_calls()
+        req, resp = reusable_client.post("/api/v1/game", data=data)
+        assert resp.status == 201
+        game_id_4, greeting_4 = resp.text.split("\n")
+        assert game_id_4 != game_id_3
+        assert greeting_4 == greeting_3
+        assert num_openai_calls() == calls_before
+        assert await db_conn.fetchval(cached_sql, game_id_3) is False
+        assert await db_conn.fetchval(cached_sql, game_id_4) is True
+
+        # The cache can be bypassed per request.
+        req, resp = reusable_client.post(
+            "/api/v1/game",
+            data=data,
+            headers={**_headers, "X-Proxy-No-Cache": "1"},
+        )
+        assert resp.status == 201
+        game_id_5, _ = resp.text.split("\n")
+        assert num_openai_calls() == calls_before + 1
+        assert await db_conn.fetchval(cached_sql, game_id_5) is False
+    finally:
+        chatgpt_proxy.app.initial_response_cache_enabled = False
 
     # Empty data.
     data = ""
@@ -372,18 +427,48 @@ async def test_api_v1_put_game(api_fixture, caplog) -> None:
     req, resp = reusable_client.put("/api/v1/game/first_game", data=data)
     assert resp.status == 204
 
+    game = await queries.select_game(db_conn, "first_game")
+    assert game
+    assert game.stop_time == game.start_time + datetime.timedelta(seconds=world_time)
+
     # Bad data -> 400.
     bad_world_time = "this is not a float"
     data = f"{bad_world_time}"
     req, resp = reusable_client.put("/api/v1/game/first_game", data=data)
     assert resp.status == 400
 
+    for bad_world_time in ("inf", "nan", "1e300"):
+        req, resp = reusable_client.put("/api/v1/game/first_game", data=bad_world_time)
+        assert resp.status == 400, bad_world_time
+
+    # Way too long body -> 413.
+    data = "1" * 1000
+    req, resp = reusable_client.put("/api/v1/game/first_game", data=data)
+    assert resp.status == 413
+
+    # Game belongs to another server.
+    data = f"{world_time}"
+    req, resp = reusable_client.put("/api/v1/game/game_from_forbidden_server", data=data)
+    assert resp.status == 401
+
     # Non-existent game.
     data = "this doesn't matter in this case!"
     req, resp = reusable_client.put("/api/v1/game/asdasdasd1243", data=data)
     assert resp.status == 404
 
 
+@pytest.mark.asyncio
+async def test_health_and_options(api_fixture, caplog) -> None:
+    caplog.set_level(logging.DEBUG)
+    api_app, reusable_client, openai_mock_router, steam_mock_router, db_conn = api_fixture
+
+    req, resp = reusable_client.get("/health", headers={"Authorization": ""})
+    assert resp.status == 200
+
+    req, resp = reusable_client.options("/api/v1/game", headers={"Authorization": ""})
+    assert resp.status == 204
+
+
 @pytest.mark.asyncio
 async def test_api_v1_post_game_invalid_token(api_fixture, caplog) -> None:
     caplog.set_level(logging.DEBUG)
@@ -427,6 +512,8 @@ async def test_api_v1_post_game_invalid_token(api_fixture, caplog) -> None:
     assert resp.status == 401
 
     logger.info("testing Steam not recognizing the dedicated server")
+    # The token was verified above, forget it to make sure Steam is queried again.
+    auth.clear_caches()
     with steam_mock_router:
         steam_mock_router.get(
             "IGameServersService/GetServerList/v1/",
@@ -448,6 +535,7 @@ async def test_api_v1_post_game_invalid_token(api_fixture, caplog) -> None:
         assert resp_.status == 401, resp_.body
 
     logger.info("testing Steam API returning garbage")
+    auth.clear_caches()
     with steam_mock_router:
         steam_mock_router.get(
             "IGameServersService/GetServerList/v1/",
@@ -554,6 +642,7 @@ async def test_api_v1_post_game_chat_message(api_fixture, caplog) -> None:
     try:
         # Make sure there aren't any cached Steam Web API results.
         await app_cache.clear()
+        auth.clear_caches()
         del os.environ["STEAM_WEB_API_KEY"]
         chatgpt_proxy.auth.load_config()
         path = "/api/v1/game/first_game/chat_message"
@@ -734,11 +823,11 @@ async def test_api_v1_put_game_objective_state(api_fixture, caplog) -> None:
     req, resp = reusable_client.put(path, data=data)
     assert resp.status == 400
 
-    # Too much data -> 400.
+    # Too much data -> 413.
     data = "*" * (max_ast_literal_eval_size + 1)
     path = "/api/v1/game/first_game/objective_state"
     req, resp = reusable_client.put(path, data=data)
-    assert resp.status == 400
+    assert resp.status == 413
 
     # Valid but wrong Python object.
     data = "()"
@@ -783,6 +872,12 @@ async def test_api_v1_post_game_kill(api_fixture, caplog) -> None:
     req, resp = reusable_client.post(path, data=data)
     assert resp.status == 400
 
+    # Too long data -> 413.
+    data = "353.4503560\nSome guy lmao\nI'mDead:(\n0\n1\n" + ("x" * 512) + "\n88.53"
+    path = "/api/v1/game/first_game/kill"
+    req, resp = reusable_client.post(path, data=data)
+    assert resp.status == 413
+
     # Valid request.
     data = "353.4503560\nSome guy lmao\nI'mDead:(\n0\n1\nRODmgType_SomeTypeLol\n88.53"
     path = "/api/v1/game/first_game/kill"
@@ -800,6 +895,40 @@ async def test_api_v1_post_game_kill(api_fixture, caplog) -> None:
     assert kills
 
 
+@pytest.mark.asyncio
+async def test_api_v1_batch_writer(api_fixture, caplog) -> None:
+    caplog.set_level(logging.DEBUG)
+    api_app, reusable_client, openai_mock_router, steam_mock_router, db_conn = api_fixture
+
+    kill_writer = reusable_client.app.ctx.kill_writer
+
+    def kill_record(game_id: str) -> queries.GameKillRecord:
+        return (game_id, utcnow(), "Killer", "Victim", 0, 1, "RODmgType_XXX", 1.0)
+
+    # A bad record in a batch should only fail its own write.
+    results = await asyncio.gather(
+        kill_writer.write(kill_record("first_game")),
+        kill_writer.write(kill_record("THIS_GAME_DOES_NOT_EXIST")),
+        kill_writer.write(kill_record("first_game")),
+        return_exceptions=True,
+    )
+    assert results[0] is None
+    assert isinstance(results[1], asyncpg.ForeignKeyViolationError)
+    assert results[2] is None
+
+    kills = await queries.select_game_kills(conn=db_conn, game_id="first_game")
+    assert len(kills) == 2
+
+    # Game is deleted after it was checked (and cached) -> 404.
+    data = "353.4503560\nSome guy lmao\nI'mDead:(\n0\n1\nRODmgType_SomeTypeLol\n88.53"
+    path = "/api/v1/game/first_game/kill"
+    req, resp = reusable_client.post(path, data=data)
+    assert resp.status == 204
+    await db_conn.execute("""DELETE FROM "game" WHERE id = 'first_game';""")
+    req, resp = reusable_client.post(path, data=data)
+    assert resp.status == 404
+
+
 @pytest.mark.asyncio
 async def test_api_v1_game_message(api_fixture, caplog) -> None:
     caplog.set_level(logging.DEBUG)
@@ -827,7 +956,7 @@ async def test_api_v1_game_message(api_fixture, caplog) -> None:
         """
     )
 
-    # Sneak in a request here -> should be 503 since the query does not exist!
+    # Sneak in a request here -> should be 503 since the response time is not set!
     data = ""
     path = "/api/v1/game/first_game/message"
     req, resp = reusable_client.post(path, data=data)
@@ -851,6 +980,13 @@ async def test_api_v1_game_message(api_fixture, caplog) -> None:
                 'pytest_dummy_openapi_response_id');
         """
     )
+    await db_conn.execute(
+        """
+        UPDATE "game"
+        SET openai_previous_response_time = NOW() AT TIME ZONE 'UTC'
+        WHERE id = 'first_game';
+        """
+    )
 
     # Initialized game, bad data -> 400.
     data = ""
@@ -872,6 +1008,16 @@ async def test_api_v1_game_message(api_fixture, caplog) -> None:
     assert resp.status == 200
     assert resp.text.split("\n")[-1] == output_text.replace("\n", " ")
 
+    # The game continues from the latest response.
+    game = await queries.select_game(db_conn, "first_game")
+    assert game
+    assert game.openai_previous_response_id == "testing_0"
+    assert game.openai_previous_response_time
+    query = await queries.select_openai_query(db_conn, "testing_0")
+    assert query
+    assert query.game_id == "first_game"
+    assert query.time == game.openai_previous_response_time
+
     # Valid request, with some messages and kills belonging to the game.
     await queries.insert_game_kill(
         conn=db_conn,
@@ -911,3 +1057,10 @@ async def test_api_v1_game_message(api_fixture, caplog) -> None:
     req, resp = reusable_client.post(path, data=data)
     assert resp.status == 200
     assert resp.text.split("\n")[-1] == output_text.replace("\n", " ")
+
+
+def test_sanitize_level_name() -> None:
+    assert sanitize_level_name("VNLL-Resort") == "Resort"
+    assert sanitize_level_name("Resort") == "Resort"
+    assert sanitize_level_name("A-B_C") == "B C"
+    assert sanitize_level_name("VNTE-Hue_City_Night") == "Hue City Night"
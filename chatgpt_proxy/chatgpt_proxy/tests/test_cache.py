@@ -0,0 +1,52 @@
+# MIT License
+#
+# Copyright (c) 2025 Tuomo Kriikkula
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+
+from chatgpt_proxy.cache import TTLCache
+
+
+def test_ttl_cache_lru_eviction() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=60.0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # Marks "a" as recently used.
+    cache.set("c", 3)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.pop("c") == 3
+    assert cache.pop("c") is None
+
+
+def test_ttl_cache_expiration() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=8, ttl=60.0)
+    cache.set("expired", 1, ttl=0.01)
+    cache.set("not_stored", 2, ttl=-1.0)
+    cache.set("clamped", 3, ttl=9999.0)
+    time.sleep(0.02)
+    assert cache.get("expired") is None
+    assert cache.get("not_stored") is None
+    assert cache.get("clamped") == 3
+    cache.clear()
+    assert len(cache) == 0
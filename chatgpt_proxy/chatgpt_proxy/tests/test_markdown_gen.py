@@ -25,17 +25,25 @@ from typing import AsyncGenerator
 import asyncpg
 import pytest
 import pytest_asyncio
+from py_markdown_table.markdown_table import markdown_table as py_markdown_table
 
 from chatgpt_proxy.db import pool_acquire
+from chatgpt_proxy.db import queries
+from chatgpt_proxy.db.models import GameKill
+from chatgpt_proxy.db.models import GamePlayer
+from chatgpt_proxy.db.models import SayType
+from chatgpt_proxy.db.models import Team
 from chatgpt_proxy.tests import setup
 from chatgpt_proxy.tests.setup import common_test_setup
 from chatgpt_proxy.tests.setup import default_test_db_timeout
+from chatgpt_proxy.utils import markdown_table
 from chatgpt_proxy.utils import utcnow
 
 common_test_setup()
 
 from chatgpt_proxy.app import get_chat_messages_markdown_table  # noqa: E402
 from chatgpt_proxy.app import get_kills_markdown_table  # noqa: E402
+from chatgpt_proxy.app import get_markdown_tables  # noqa: E402
 from chatgpt_proxy.app import get_scoreboard_markdown_table  # noqa: E402
 
 _db_timeout = default_test_db_timeout
@@ -94,3 +102,56 @@ async def test_markdown_gen(maintenance_fixture):
     _ = await get_scoreboard_markdown_table(conn, "TODO")
     _ = await get_kills_markdown_table(conn, "TODO", now_todo)
     _ = await get_chat_messages_markdown_table(conn, "TODO", now_todo)
+
+
+@pytest.mark.asyncio
+async def test_markdown_tables_single_query(maintenance_fixture):
+    conn = maintenance_fixture
+
+    start = utcnow()
+    for i in range(3):
+        await queries.insert_game_kill(
+            conn=conn,
+            game_id="first_game",
+            kill_time=utcnow(),
+            killer_name=f"killer {i}",
+            victim_name=f"victim {i}",
+            killer_team=Team.North,
+            victim_team=Team.South,
+            damage_type="RODmgType_M16",
+            kill_distance_m=10.5 * i,
+        )
+        await queries.insert_game_chat_message(
+            conn=conn,
+            game_id="first_game",
+            message=f"message {i}",
+            send_time=utcnow(),
+            sender_name=f"sender {i}",
+            sender_team=Team.South,
+            channel=SayType.ALL,
+        )
+
+    # The combined query must produce the same tables as the separate ones.
+    _, kills, chat_msgs = await get_markdown_tables(conn, "first_game", start)
+    assert kills[0] == 3
+    assert kills == await get_kills_markdown_table(conn, "first_game", start)
+    assert chat_msgs[0] == 3
+    assert chat_msgs == await get_chat_messages_markdown_table(conn, "first_game", start)
+
+
+def test_markdown_table_parity() -> None:
+    players = [
+        GamePlayer(game_id="x", id=0, name="a", team=Team.North, score=0),
+        GamePlayer(game_id="x", id=1, name="Some Longer Näme", team=Team.South, score=12345),
+        GamePlayer(game_id="x", id=2, name="odd", team=Team.Neutral, score=-5),
+    ]
+    kills = [
+        GameKill(id=0, game_id="x", kill_time=utcnow(), killer_name="Killer",
+                 victim_name="V", killer_team=Team.North, victim_team=Team.South,
+                 damage_type="RODmgType_M16", kill_distance_m=123.456),
+    ]
+
+    for model, objs in ((GamePlayer, players), (GameKill, kills)):
+        expected = py_markdown_table([obj.as_markdown_dict() for obj in objs]).get_markdown()
+        got = markdown_table(model.markdown_columns, (obj.as_markdown_row() for obj in objs))
+        assert got == expected
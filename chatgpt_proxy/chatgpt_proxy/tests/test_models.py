@@ -34,3 +34,21 @@ def test_game_objective_state():
     with pytest.raises(ValueError):
         GameObjectiveState.from_wire_format(
             "asd", "x" * (max_ast_literal_eval_size + 1))
+
+
+def test_game_objective_state_json():
+    ok_data = b'[["BlaBla", 0], ["AnotherObjective", 1], ["Neutral \xc3\x84", 3]]'
+    gos = GameObjectiveState.from_wire_format("some_id_here", ok_data)
+    assert [obj.name for obj in gos.objectives] == ["BlaBla", "AnotherObjective", "Neutral Ä"]
+
+    roundtrip = GameObjectiveState.from_wire_format("some_id_here", gos.wire_format())
+    assert roundtrip == gos
+
+    with pytest.raises(ValueError):
+        GameObjectiveState.from_wire_format("asd", b'[["BlaBla", "0"]]')
+    with pytest.raises(ValueError):
+        GameObjectiveState.from_wire_format("asd", b'[["BlaBla", 2]]')
+    with pytest.raises(ValueError):
+        GameObjectiveState.from_wire_format("asd", b'[["BlaBla", 0, 1]]')
+    with pytest.raises(ValueError):
+        GameObjectiveState.from_wire_format("asd", b'["BlaBla"]')
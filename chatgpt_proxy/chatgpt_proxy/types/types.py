@@ -22,8 +22,10 @@
 
 """Common and shared project type definitions."""
 
+import asyncio
 import ipaddress
 from types import SimpleNamespace
+from typing import Any
 from typing import TypeAlias
 
 import asyncpg
@@ -31,13 +33,41 @@ import httpx
 import openai
 import sanic
 
+from chatgpt_proxy.db import BatchWriter
 from chatgpt_proxy.db import models
+from chatgpt_proxy.db import queries
 
 
 class Context(SimpleNamespace):
+    # Our own attributes are slotted. Sanic extensions also store their
+    # own attributes in the app context, those still go in __dict__.
+    __slots__ = (
+        "_client",
+        "_pg_pool",
+        "_http_client",
+        "_game_id_queue",
+        "game_id_refill_task",
+        "_kill_writer",
+        "_chat_message_writer",
+    )
+
     _client: openai.AsyncOpenAI | None
     _pg_pool: asyncpg.Pool | None
     _http_client: httpx.AsyncClient | None
+    _game_id_queue: asyncio.Queue[str] | None
+    game_id_refill_task: asyncio.Task[None] | None
+    _kill_writer: BatchWriter[queries.GameKillRecord] | None
+    _chat_message_writer: BatchWriter[queries.GameChatMessageRecord] | None
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._client = None
+        self._pg_pool = None
+        self._http_client = None
+        self._game_id_queue = None
+        self.game_id_refill_task = None
+        self._kill_writer = None
+        self._chat_message_writer = None
 
     @property
     def client(self) -> openai.AsyncOpenAI:
@@ -69,11 +99,56 @@ class Context(SimpleNamespace):
     def http_client(self, value: httpx.AsyncClient):
         self._http_client = value
 
+    @property
+    def game_id_queue(self) -> asyncio.Queue[str]:
+        if self._game_id_queue is None:
+            raise RuntimeError("Context game_id_queue is None")
+        return self._game_id_queue
+
+    @game_id_queue.setter
+    def game_id_queue(self, value: asyncio.Queue[str]):
+        self._game_id_queue = value
+
+    @property
+    def kill_writer(self) -> BatchWriter[queries.GameKillRecord]:
+        if self._kill_writer is None:
+            raise RuntimeError("Context kill_writer is None")
+        return self._kill_writer
+
+    @kill_writer.setter
+    def kill_writer(self, value: BatchWriter[queries.GameKillRecord]):
+        self._kill_writer = value
+
+    @property
+    def chat_message_writer(self) -> BatchWriter[queries.GameChatMessageRecord]:
+        if self._chat_message_writer is None:
+            raise RuntimeError("Context chat_message_writer is None")
+        return self._chat_message_writer
+
+    @chat_message_writer.setter
+    def chat_message_writer(self, value: BatchWriter[queries.GameChatMessageRecord]):
+        self._chat_message_writer = value
+
 
 class RequestContext(SimpleNamespace):
-    jwt_game_server_address: ipaddress.IPv4Address | None = None
-    jwt_game_server_port: int | None = None
-    _game: models.Game | None = None
+    __slots__ = (
+        "jwt_game_server_address",
+        "jwt_game_server_port",
+        "_game",
+        "_conn",
+    )
+
+    jwt_game_server_address: ipaddress.IPv4Address | None
+    jwt_game_server_port: int | None
+    _game: models.Game | None
+    _conn: asyncpg.Connection | None
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.jwt_game_server_address = None
+        self.jwt_game_server_port = None
+        self._game = None
+        self._conn = None
 
     @property
     def game(self) -> models.Game:
@@ -85,6 +160,16 @@ class RequestContext(SimpleNamespace):
     def game(self, value: models.Game):
         self._game = value
 
+    @property
+    def conn(self) -> asyncpg.Connection:
+        if self._conn is None:
+            raise RuntimeError("RequestContext conn is None")
+        return self._conn
+
+    @conn.setter
+    def conn(self, value: asyncpg.Connection | None):
+        self._conn = value
+
 
 App: TypeAlias = sanic.Sanic[sanic.Config, Context]
 
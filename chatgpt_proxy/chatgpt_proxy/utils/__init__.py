@@ -1,9 +1,15 @@
+from .markdown import markdown_table
 from .utils import get_remote_addr
+from .utils import get_remote_addr_str
 from .utils import is_prod_env
+from .utils import max_body_size
 from .utils import utcnow
 
 __all__ = [
     "get_remote_addr",
+    "get_remote_addr_str",
     "is_prod_env",
+    "markdown_table",
+    "max_body_size",
     "utcnow",
 ]
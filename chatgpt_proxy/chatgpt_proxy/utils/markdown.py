@@ -0,0 +1,65 @@
+# MIT License
+#
+# Copyright (c) 2025 Tuomo Kriikkula
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Markdown table rendering for LLM prompts."""
+
+from typing import Any
+from typing import Iterable
+from typing import Sequence
+
+
+def _center(value: str, width: int) -> str:
+    # Odd padding goes to the beginning of the cell.
+    margin = width - len(value)
+    right = margin // 2
+    return " " * (margin - right) + value + " " * right
+
+
+def markdown_table(
+        columns: Sequence[str],
+        rows: Iterable[Sequence[Any]],
+) -> str:
+    """Render rows as a fenced ASCII grid table. The output is identical
+    to py_markdown_table's default rendering, without its per-cell
+    validation and padding bookkeeping.
+    """
+    str_rows = [[str(value) for value in row] for row in rows]
+
+    widths = [len(column) for column in columns]
+    for row in str_rows:
+        for i, value in enumerate(row):
+            if len(value) > widths[i]:
+                widths[i] = len(value)
+
+    sep = "+" + "+".join("-" * width for width in widths) + "+"
+    lines = [
+        "```",
+        sep,
+        "|" + "|".join(_center(c, w) for c, w in zip(columns, widths)) + "|",
+    ]
+    for row in str_rows:
+        lines.append(sep)
+        lines.append("|" + "|".join(_center(v, w) for v, w in zip(row, widths)) + "|")
+    lines.append(sep + "```")
+
+    return "\n".join(lines)
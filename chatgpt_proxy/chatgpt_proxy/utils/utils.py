@@ -25,21 +25,52 @@
 import datetime
 import ipaddress
 import os
+from functools import wraps
+from http import HTTPStatus
+from typing import Callable
+
+import sanic
 
 from chatgpt_proxy.types import Request
 
 is_prod_env: bool = "FLY_APP_NAME" in os.environ
 
 
+def get_remote_addr_str(request: Request) -> str:
+    """Unparsed remote address, for cheap comparisons in the hot path."""
+    if is_prod_env:
+        return request.headers["Fly-Client-IP"]
+    else:
+        return request.client_ip
+
+
 def get_remote_addr(request: Request) -> ipaddress.IPv4Address:
     """Ignoring IPv6 since Steam game servers should always
     be IPv4, and this API only expects requests from Steam GSs.
     """
-    if is_prod_env:
-        return ipaddress.IPv4Address(request.headers["Fly-Client-IP"])
-    else:
-        return ipaddress.IPv4Address(request.client_ip)
+    return ipaddress.IPv4Address(get_remote_addr_str(request))
 
 
 def utcnow() -> datetime.datetime:
     return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+def max_body_size(size: int) -> Callable:
+    """Reject requests with a body longer than size bytes before
+    running the handler, or any decorators applied after this one.
+    """
+
+    def decorator(f: Callable) -> Callable:
+        @wraps(f)
+        async def size_checked_handler(
+                request: Request,
+                *args,
+                **kwargs,
+        ) -> sanic.HTTPResponse:
+            if len(request.body) > size:
+                return sanic.HTTPResponse(status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            return await f(request, *args, **kwargs)
+
+        return size_checked_handler
+
+    return decorator